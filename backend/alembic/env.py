@@ -12,6 +12,7 @@ from app.models.tournament import Tournament
 from app.models.trade import Trade
 from app.models.position import Position
 from app.models.wallet import Wallet
+from app.models.candle import Candle
 from dotenv import load_dotenv
 
 backend_dir = os.path.dirname(os.path.dirname(__file__))
@@ -1,34 +1,63 @@
-from fastapi import APIRouter, HTTPException, Query
-from ..services.binance_service import BinanceService
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Response
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse
+from sqlalchemy.orm import Session
+from ..db import get_db
+from ..services.candle_builder import INTERVAL_SECONDS, candle_builder
+from ..services.candle_codec import to_columns, to_msgpack
+from ..services.candle_service import candle_service
+from ..services.candle_store import CandleStore
+from ..config import settings
 from ..utils.logger import logger
-from typing import List, Dict
-import redis
-import json
-import os
+from typing import List, Dict, Optional, Union
 
 router = APIRouter()
 
-# Initialize Redis client
-redis_client = redis.Redis(
-    host=os.getenv('REDIS_HOST', 'localhost'),
-    port=int(os.getenv('REDIS_PORT', 6379)),
-    decode_responses=True,
-    socket_connect_timeout=5
-)
+CANDLE_FORMATS = ("json", "columnar", "msgpack")
+MSGPACK_MEDIA_TYPES = ("application/msgpack", "application/x-msgpack")
 
-@router.get("/{symbol}")
+
+def _negotiate_format(format: Optional[str], accept: Optional[str]) -> str:
+    """Explicit ?format= wins, then a msgpack Accept header, else json"""
+    if format is not None:
+        if format not in CANDLE_FORMATS:
+            raise HTTPException(status_code=400, detail=f"Unsupported format: {format}")
+        return format
+    if accept and any(media_type in accept for media_type in MSGPACK_MEDIA_TYPES):
+        return "msgpack"
+    return "json"
+
+
+def _render(candles: List[Dict], fmt: str) -> Union[List[Dict], Response]:
+    """
+    json: list of per-bar dicts (lightweight-charts format)
+    columnar: {"time": [...], "open": [...], "high": [...], "low": [...], "close": [...], "volume": [...]}
+    msgpack: the columnar payload as msgpack
+    """
+    if fmt == "msgpack":
+        return Response(content=to_msgpack(candles), media_type="application/x-msgpack")
+    if fmt == "columnar":
+        return JSONResponse(to_columns(candles))
+    return candles
+
+
+@router.get("/{symbol}", response_model=None)
 async def get_historical_candles(
     symbol: str,
     interval: str = Query("1m", description="Candle interval: 1m, 3m, 5m, 15m, 30m, 1h"),
-    limit: int = Query(100, description="Number of candles to fetch", ge=1, le=1000)
-) -> List[Dict]:
+    limit: int = Query(100, description="Number of candles to fetch", ge=1, le=1000),
+    format: Optional[str] = Query(None, description="Response format: json (default), columnar, msgpack"),
+    accept: Optional[str] = Header(None)
+) -> Union[List[Dict], Response]:
     """
     Fetch historical candles from Binance with Redis caching.
     
     Caching strategy:
-    - Cache TTL: 5 minutes (300 seconds)
-    - Reduces Binance API calls by ~90%
-    - Faster response times for users
+    - Symbols streamed over WebSocket are served from the in-memory
+      candle builder once it holds `limit` bars
+    - Otherwise assembled from interval-aligned Redis chunks
+      (CANDLE_CHUNK_BARS bars each), shared by every limit and range
+    - Closed chunks are cached long, the chunk with the live bar briefly
     
     Returns candles in format compatible with lightweight-charts:
     [
@@ -41,54 +70,27 @@ async def get_historical_candles(
         },
         ...
     ]
+    
+    format=columnar (or msgpack, also via Accept: application/x-msgpack)
+    returns parallel arrays per field instead.
     """
+    if interval not in INTERVAL_SECONDS:
+        raise HTTPException(status_code=400, detail=f"Unsupported interval: {interval}")
+    fmt = _negotiate_format(format, accept)
+    
     try:
-        # Create cache key
-        cache_key = f"candles:{symbol}:{interval}:{limit}"
-        
-        # Try to get from cache first
-        try:
-            cached_data = redis_client.get(cache_key)
-            if cached_data:
-                logger.info(f"✅ Cache HIT for {symbol} {interval} (limit={limit})")
-                return json.loads(cached_data)
-        except redis.RedisError as e:
-            logger.warning(f"Redis error (continuing without cache): {e}")
-        
-        # Cache MISS - fetch from Binance
-        logger.info(f"❌ Cache MISS - Fetching {limit} {interval} candles for {symbol} from Binance")
+        # Live tail straight from the trade stream
+        candles = candle_builder.get_candles(symbol, interval, limit)
+        if candles is not None:
+            return _render(candles, fmt)
         
-        # Initialize Binance service
-        binance = BinanceService()
+        candles = await candle_service.get_latest(symbol, interval, limit)
         
-        # Fetch klines from Binance
-        klines = binance.get_klines(symbol=symbol, interval=interval, limit=limit)
-        
-        # Transform to lightweight-charts format
-        candles = []
-        for kline in klines:
-            candles.append({
-                "time": int(kline[0]) // 1000,  # Convert milliseconds to seconds
-                "open": float(kline[1]),
-                "high": float(kline[2]),
-                "low": float(kline[3]),
-                "close": float(kline[4]),
-                "volume": float(kline[5])
-            })
-        
-        # Cache the result for 5 minutes (300 seconds)
-        try:
-            redis_client.setex(
-                cache_key,
-                300,  # TTL: 5 minutes
-                json.dumps(candles)
-            )
-            logger.info(f"💾 Cached {len(candles)} candles for {symbol} (TTL: 5 min)")
-        except redis.RedisError as e:
-            logger.warning(f"Failed to cache data (continuing): {e}")
+        # History for the in-memory builder (no-op if the symbol isn't streamed)
+        candle_builder.seed(symbol, interval, candles)
         
         logger.info(f"Successfully fetched {len(candles)} candles for {symbol}")
-        return candles
+        return _render(candles, fmt)
         
     except Exception as e:
         logger.error(f"Error fetching candles for {symbol}: {e}")
@@ -98,75 +100,51 @@ async def get_historical_candles(
         )
 
 
-@router.get("/{symbol}/range")
+@router.get("/{symbol}/range", response_model=None)
 async def get_candles_by_range(
     symbol: str,
     interval: str = Query("1m"),
     start_time: int = Query(..., description="Start time in Unix seconds"),
-    end_time: int = Query(..., description="End time in Unix seconds")
-) -> List[Dict]:
+    end_time: int = Query(..., description="End time in Unix seconds"),
+    format: Optional[str] = Query(None, description="Response format: json (default), columnar, msgpack"),
+    accept: Optional[str] = Header(None),
+    db: Session = Depends(get_db)
+) -> Union[List[Dict], Response]:
     """
-    Fetch candles for a specific time range with Redis caching.
+    Fetch candles for a specific time range.
     Useful for backfilling when user scrolls to older data.
+    
+    Served from the local candle store when it covers the whole range,
+    otherwise assembled from the same cached chunks as the latest-bars
+    endpoint (missing chunks come from Binance and are stored).
     """
+    if interval not in INTERVAL_SECONDS:
+        raise HTTPException(status_code=400, detail=f"Unsupported interval: {interval}")
+    if end_time < start_time:
+        raise HTTPException(status_code=400, detail="end_time must not be before start_time")
+    if (end_time - start_time) // INTERVAL_SECONDS[interval] > settings.CANDLE_RANGE_MAX_BARS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Range too large: at most {settings.CANDLE_RANGE_MAX_BARS} candles per request"
+        )
+    fmt = _negotiate_format(format, accept)
+    
     try:
-        # Create cache key for range queries
-        cache_key = f"candles_range:{symbol}:{interval}:{start_time}:{end_time}"
-        
-        # Try cache first
         try:
-            cached_data = redis_client.get(cache_key)
-            if cached_data:
-                logger.info(f"✅ Cache HIT for range query {symbol} {interval}")
-                return json.loads(cached_data)
-        except redis.RedisError as e:
-            logger.warning(f"Redis error (continuing without cache): {e}")
-        
-        logger.info(f"❌ Cache MISS - Fetching {interval} candles for {symbol} from {start_time} to {end_time}")
-        
-        binance = BinanceService()
-        
-        # Convert seconds to milliseconds for Binance API
-        start_ms = start_time * 1000
-        end_ms = end_time * 1000
-        
-        # Calculate approximate number of candles needed
-        interval_seconds = {
-            '1m': 60, '3m': 180, '5m': 300, 
-            '15m': 900, '30m': 1800, '1h': 3600
-        }
-        
-        time_diff = end_time - start_time
-        estimated_candles = int(time_diff / interval_seconds.get(interval, 60))
-        limit = min(estimated_candles + 10, 1000)  # Add buffer, max 1000
-        
-        klines = binance.get_klines(symbol=symbol, interval=interval, limit=limit)
-        
-        # Filter and transform
-        candles = []
-        for kline in klines:
-            candle_time = int(kline[0]) // 1000
-            
-            # Only include candles in the requested range
-            if start_time <= candle_time <= end_time:
-                candles.append({
-                    "time": candle_time,
-                    "open": float(kline[1]),
-                    "high": float(kline[2]),
-                    "low": float(kline[3]),
-                    "close": float(kline[4]),
-                    "volume": float(kline[5])
-                })
+            candles = await run_in_threadpool(
+                CandleStore.get_complete_range, db, symbol, interval, start_time, end_time
+            )
+            if candles is not None:
+                logger.info(f"🗄️ Store HIT for range query {symbol} {interval}")
+                return _render(candles, fmt)
+        except Exception as e:
+            db.rollback()
+            logger.warning(f"Candle store error (continuing without store): {e}")
         
-        # Cache for 5 minutes
-        try:
-            redis_client.setex(cache_key, 300, json.dumps(candles))
-            logger.info(f"💾 Cached {len(candles)} range candles (TTL: 5 min)")
-        except redis.RedisError as e:
-            logger.warning(f"Failed to cache data: {e}")
+        candles = await candle_service.get_range(symbol, interval, start_time, end_time)
         
         logger.info(f"Successfully fetched {len(candles)} candles in range")
-        return candles
+        return _render(candles, fmt)
         
     except Exception as e:
         logger.error(f"Error fetching candles by range: {e}")
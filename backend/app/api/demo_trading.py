@@ -1,4 +1,5 @@
 from fastapi import APIRouter, Depends, HTTPException
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
 from ..db import SessionLocal
 from ..api.dependencies import get_current_user
@@ -6,6 +7,7 @@ from ..models.user import User
 from ..schemas.demo_wallet import DemoWalletCreate, DemoWalletResponse
 from ..schemas.demo_order import DemoOrderCreate, DemoOrderResponse
 from ..services.demo_trading_engine import DemoTradingEngine
+from ..services.binance_service import BinanceService, get_binance_service
 from ..utils.logger import logger
 
 router = APIRouter()
@@ -31,12 +33,13 @@ def get_wallet(
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/price")
-def get_price(symbol: str = "BTCUSDT"):
+async def get_price(
+    symbol: str = "BTCUSDT",
+    binance: BinanceService = Depends(get_binance_service)
+):
     """Get current price for a symbol (no auth required for price feed)"""
     try:
-        from ..services.binance_service import BinanceService
-        binance = BinanceService()
-        price = binance.get_current_price(symbol)
+        price = await binance.aget_current_price(symbol)
         
         if not price:
             raise HTTPException(status_code=400, detail=f"Could not fetch price for {symbol}")
@@ -65,19 +68,18 @@ def deposit_to_wallet(
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.post("/orders", response_model=DemoOrderResponse)
-def place_order(
+async def place_order(
     order_data: DemoOrderCreate,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_db),
+    binance: BinanceService = Depends(get_binance_service)
 ):
     """Place a new demo order"""
     try:
         logger.info(f"📋 Received order request: symbol={order_data.symbol}, side={order_data.side}, size={order_data.size}, sl={order_data.stop_loss}, tp={order_data.take_profit}")
         
-        # Get current price from binance_service
-        from ..services.binance_service import BinanceService
-        binance = BinanceService()
-        current_price = binance.get_current_price(order_data.symbol)
+        # Get current price from the shared price oracle
+        current_price = await binance.aget_current_price(order_data.symbol)
         
         if not current_price:
             logger.error(f"❌ Could not fetch price for {order_data.symbol}")
@@ -85,7 +87,9 @@ def place_order(
         
         logger.info(f"💰 Current price: {current_price}")
         
-        order = DemoTradingEngine.place_order(
+        # DB work stays synchronous, so run it off the event loop
+        order = await run_in_threadpool(
+            DemoTradingEngine.place_order,
             db=db,
             user_id=current_user.id,
             symbol=order_data.symbol,
@@ -108,12 +112,16 @@ def place_order(
 def get_orders(
     status: str = None,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_db),
+    binance: BinanceService = Depends(get_binance_service)
 ):
-    """Get user's demo orders"""
+    """Get user's demo orders (open orders marked to the live price)"""
     try:
         orders = DemoTradingEngine.get_user_orders(db, current_user.id, status)
-        return orders
+        return [
+            DemoTradingEngine.with_unrealized_pnl(order, binance.get_cached_price(order.symbol))
+            for order in orders
+        ]
     except Exception as e:
         logger.error(f"Error fetching orders: {e}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -122,14 +130,15 @@ def get_orders(
 def get_order(
     order_id: int,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_db),
+    binance: BinanceService = Depends(get_binance_service)
 ):
-    """Get specific demo order"""
+    """Get specific demo order (marked to the live price if open)"""
     try:
         order = DemoTradingEngine.get_order_by_id(db, order_id, current_user.id)
         if not order:
             raise HTTPException(status_code=404, detail="Order not found")
-        return order
+        return DemoTradingEngine.with_unrealized_pnl(order, binance.get_cached_price(order.symbol))
     except HTTPException:
         raise
     except Exception as e:
@@ -137,17 +146,18 @@ def get_order(
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.post("/orders/{order_id}/close", response_model=DemoOrderResponse)
-def close_order(
+async def close_order(
     order_id: int,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_db),
+    binance: BinanceService = Depends(get_binance_service)
 ):
     """Manually close an open order at current market price"""
     try:
         logger.info(f"🔴 User {current_user.id} requesting to close order {order_id}")
         
         # Get the order
-        order = DemoTradingEngine.get_order_by_id(db, order_id, current_user.id)
+        order = await run_in_threadpool(DemoTradingEngine.get_order_by_id, db, order_id, current_user.id)
         if not order:
             raise HTTPException(status_code=404, detail="Order not found")
         
@@ -155,15 +165,13 @@ def close_order(
             raise HTTPException(status_code=400, detail=f"Cannot close order with status: {order.status}")
         
         # Get current price
-        from ..services.binance_service import BinanceService
-        binance = BinanceService()
-        current_price = binance.get_current_price(order.symbol)
+        current_price = await binance.aget_current_price(order.symbol)
         
         if not current_price:
             raise HTTPException(status_code=400, detail=f"Could not fetch current price for {order.symbol}")
         
         # Close the order
-        closed_order = DemoTradingEngine.close_order_manual(db, order, current_price)
+        closed_order = await run_in_threadpool(DemoTradingEngine.close_order_manual, db, order, current_price)
         logger.info(f"✅ Order {order_id} closed manually. PnL: ${closed_order.pnl}")
         
         return closed_order
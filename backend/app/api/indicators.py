@@ -0,0 +1,67 @@
+from fastapi import APIRouter, HTTPException, Query
+from ..services.candle_builder import INTERVAL_SECONDS
+from ..services.indicator_engine import INDICATOR_DEFAULTS, indicator_engine, normalize_params
+from ..utils.logger import logger
+from typing import Dict, Optional
+
+router = APIRouter()
+
+@router.get("/{symbol}")
+async def get_indicator(
+    symbol: str,
+    indicator: str = Query(..., description="sma, ema, rsi, macd, bollinger, vwap"),
+    interval: str = Query("1m", description="Candle interval: 1m, 3m, 5m, 15m, 30m, 1h"),
+    limit: int = Query(100, description="Number of values to return", ge=1, le=1000),
+    period: Optional[int] = Query(None, description="sma/ema/rsi/bollinger period"),
+    fast: Optional[int] = Query(None, description="MACD fast period"),
+    slow: Optional[int] = Query(None, description="MACD slow period"),
+    signal: Optional[int] = Query(None, description="MACD signal period"),
+    stddev: Optional[float] = Query(None, description="Bollinger band width in standard deviations")
+) -> Dict:
+    """
+    Compute an indicator server-side over the latest candles.
+    
+    Returns columnar values aligned with the candle times (null until the
+    indicator has enough history):
+    {
+        "symbol": "BTCUSDT",
+        "interval": "1m",
+        "indicator": "macd",
+        "params": {"fast": 12, "signal": 9, "slow": 26},
+        "time": [1732265100, ...],
+        "values": {"macd": [...], "signal": [...], "histogram": [...]}
+    }
+    
+    Live values for each closed bar are pushed over the WebSocket after a
+    subscribe_indicator message.
+    """
+    if interval not in INTERVAL_SECONDS:
+        raise HTTPException(status_code=400, detail=f"Unsupported interval: {interval}")
+    if indicator not in INDICATOR_DEFAULTS:
+        raise HTTPException(status_code=400, detail=f"Unknown indicator: {indicator}")
+    
+    overrides = {"period": period, "fast": fast, "slow": slow, "signal": signal, "stddev": stddev}
+    try:
+        params = normalize_params(
+            indicator,
+            {name: value for name, value in overrides.items() if name in INDICATOR_DEFAULTS[indicator]}
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    try:
+        series = await indicator_engine.get_series(symbol.upper(), interval, indicator, params, limit)
+    except Exception as e:
+        logger.error(f"Error computing {indicator} for {symbol}: {e}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"Failed to compute indicator: {str(e)}"
+        )
+    
+    return {
+        "symbol": symbol.upper(),
+        "interval": interval,
+        "indicator": indicator,
+        "params": dict(params),
+        **series
+    }
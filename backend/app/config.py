@@ -12,6 +12,117 @@ class Settings(BaseSettings):
     DEBUG: bool = True
     BINANCE_TESTNET: bool = True  # Add this line
     
+    # Combined-stream pool: max streams multiplexed per socket / max sockets
+    BINANCE_WS_STREAMS_PER_CONNECTION: int = 200
+    BINANCE_WS_MAX_CONNECTIONS: int = 5
+    
+    # Min seconds between SUBSCRIBE/UNSUBSCRIBE frames on one socket
+    # (Binance drops connections sending more than 5 messages per second)
+    BINANCE_WS_MIN_SEND_INTERVAL: float = 0.3
+    
+    # Reconnect backoff (seconds) and max trades replayed per gap
+    BINANCE_RECONNECT_BASE_DELAY: float = 1.0
+    BINANCE_RECONNECT_MAX_DELAY: float = 60.0
+    BINANCE_BACKFILL_MAX_TRADES: int = 5000
+    
+    # Max seconds one stream's post-reconnect backfill may take
+    BINANCE_BACKFILL_TIMEOUT: float = 30.0
+    
+    # Max age (seconds) of a streamed price before order placement hits REST
+    PRICE_MAX_STALENESS_SECONDS: float = 2.0
+    
+    # Keep-alive HTTP connections kept open to the Binance REST API
+    BINANCE_HTTP_POOL_SIZE: int = 20
+    
+    # Async REST client (klines, ticker, exchangeInfo, aggTrades); empty
+    # follows BINANCE_TESTNET (testnet.binance.vision vs api.binance.com)
+    BINANCE_REST_URL: str = ""
+    BINANCE_REST_TIMEOUT: float = 10.0
+    BINANCE_REST_MAX_CONCURRENCY: int = 10
+    
+    # Conflated price fan-out rate to WebSocket clients (flushes per second)
+    PRICE_FLUSH_HZ: float = 5.0
+    
+    # Max seconds a single WebSocket send may take before the client is dropped
+    WS_SEND_TIMEOUT: float = 2.0
+    
+    # Per-connection outbound queue size and overflow policy
+    # ("coalesce" | "drop_oldest" | "disconnect")
+    WS_SEND_QUEUE_SIZE: int = 256
+    WS_OVERFLOW_POLICY: str = "coalesce"
+    
+    # Threads running tick-driven SL/TP DB work off the event loop
+    TICK_DB_WORKERS: int = 4
+    
+    # How often open demo orders' current_price/pnl are persisted (seconds)
+    PNL_SNAPSHOT_INTERVAL_SECONDS: float = 30.0
+    
+    # How often each worker rebuilds its SL/TP trigger index from the DB
+    # (backstop for missed cross-worker index updates)
+    ORDER_INDEX_RECONCILE_SECONDS: float = 60.0
+    
+    # Bars kept in memory per symbol and interval by the candle builder
+    CANDLE_BUFFER_SIZE: int = 1000
+    
+    # A streamed symbol counts as live while its last trade arrived at most
+    # this long ago; only then do candle reads fill quiet intervals with flat bars
+    CANDLE_FEED_LIVE_SECONDS: float = 30.0
+    
+    # How often closed candles are written to the candle store (seconds)
+    CANDLE_FLUSH_INTERVAL_SECONDS: float = 5.0
+    
+    # Largest range a single /api/candles/{symbol}/range request may span (bars)
+    CANDLE_RANGE_MAX_BARS: int = 50000
+    
+    # Candle cache: bars per interval-aligned chunk and TTLs (seconds) for
+    # fully closed chunks vs. the chunk holding the bar in progress. The open
+    # chunk is served stale (and refreshed in the background) between its
+    # soft TTL and hard TTL.
+    CANDLE_CHUNK_BARS: int = 500
+    CANDLE_CACHE_TTL_CLOSED: int = 86400
+    CANDLE_CACHE_TTL_OPEN: int = 60
+    CANDLE_CACHE_HARD_TTL_OPEN: int = 900
+    
+    # Cross-worker single-flight lock on candle cache misses
+    CANDLE_LOCK_TTL_MS: int = 10000
+    CANDLE_LOCK_POLL_SECONDS: float = 0.05
+    
+    # Max cached 1m chunks read to roll up one higher-interval chunk
+    CANDLE_ROLLUP_MAX_BASE_CHUNKS: int = 12
+    
+    # Indicator engine: largest accepted period, bars each series is computed
+    # over (plus warmup) and cached result series
+    INDICATOR_MAX_PERIOD: int = 500
+    INDICATOR_HISTORY_BARS: int = 1000
+    INDICATOR_CACHE_SIZE: int = 256
+    
+    # Redis pub/sub bridge fanning trades, leaderboard and price updates out
+    # to every uvicorn worker; delay before resubscribing after an error
+    PUBSUB_BRIDGE_ENABLED: bool = True
+    PUBSUB_RECONNECT_SECONDS: float = 1.0
+    
+    # Market data: "direct" (every worker streams Binance itself) or
+    # "ingestor" (one elected process streams Binance into Redis Streams
+    # and API workers read from there)
+    MARKET_DATA_MODE: str = "direct"
+    
+    # Ingestor election lease (ms) and how often the holder renews it and
+    # syncs its Binance streams with the requested symbols (seconds)
+    INGESTOR_LEASE_TTL_MS: int = 15000
+    INGESTOR_SYNC_SECONDS: float = 1.0
+    
+    # Redis Streams: approx. ticks kept per symbol, XREAD block (ms) / batch
+    # size, and how long a symbol stays requested without a worker renewing it
+    MARKET_STREAM_MAXLEN: int = 10000
+    MARKET_STREAM_BLOCK_MS: int = 1000
+    MARKET_STREAM_READ_COUNT: int = 1000
+    MARKET_INTEREST_TTL_SECONDS: int = 30
+    
+    # Upstream symbol streams without subscribers or open demo orders are
+    # torn down after this grace period; idle check interval (seconds)
+    SYMBOL_IDLE_GRACE_SECONDS: float = 30.0
+    SYMBOL_IDLE_SWEEP_SECONDS: float = 5.0
+    
     model_config = ConfigDict(
         env_file=".env.local",
         extra="ignore"  # This allows extra env vars without errors
@@ -2,12 +2,22 @@ from fastapi import FastAPI, WebSocket, WebSocketDisconnect, Depends, Query
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.exceptions import RequestValidationError
 from fastapi.responses import JSONResponse
-from .api import auth, tournaments, trades, admin, candles
+from .api import auth, tournaments, trades, admin, candles, indicators
 from .websocket.manager import manager
 from .websocket import handlers
 from .api.dependencies import get_current_user
+from .services.binance_service import get_binance_service
+from .services.order_trigger_index import order_trigger_index, run_index_reconcile
+from .services.pnl_snapshot import run_pnl_snapshots
+from .services.candle_store import candle_writer
+from .services.candle_builder import candle_builder
+from .services.candle_service import candle_service
+from .workers.market_ingestor import MarketIngestor
+from .config import settings
+from .db import SessionLocal
 from .models.user import User
 import json
+import asyncio
 from .utils.logger import logger  
 from .api import demo_trading
 
@@ -54,6 +64,118 @@ app.include_router(trades.router, prefix="/api/trades", tags=["trades"])
 app.include_router(admin.router, prefix="/api/admin", tags=["admin"])
 app.include_router(demo_trading.router, prefix="/api/demo-trading", tags=["demo-trading"])
 app.include_router(candles.router, prefix="/api/candles", tags=["candles"])
+app.include_router(indicators.router, prefix="/api/indicators", tags=["indicators"])
+
+# -------------------------
+# Startup: load open demo orders into the SL/TP trigger index
+# -------------------------
+@app.on_event("startup")
+def load_order_trigger_index():
+    db = SessionLocal()
+    try:
+        order_trigger_index.rebuild(db)
+    finally:
+        db.close()
+
+# -------------------------
+# Startup: periodically reconcile the trigger index with the DB
+# -------------------------
+@app.on_event("startup")
+async def start_order_index_reconcile():
+    app.state.order_index_reconcile_task = asyncio.create_task(run_index_reconcile())
+
+# -------------------------
+# Startup: begin flushing conflated price ticks
+# -------------------------
+@app.on_event("startup")
+async def start_price_conflation():
+    handlers.price_conflator.start()
+
+# -------------------------
+# Startup: periodic batched PnL snapshot of open demo orders
+# -------------------------
+@app.on_event("startup")
+async def start_pnl_snapshots():
+    app.state.pnl_snapshot_task = asyncio.create_task(run_pnl_snapshots())
+
+# -------------------------
+# Startup: candle close events (also from threadpool reads) run on this loop
+# -------------------------
+@app.on_event("startup")
+async def bind_candle_builder():
+    candle_builder.bind_loop(asyncio.get_running_loop())
+
+# -------------------------
+# Startup: write-behind of closed candles to the candle store
+# -------------------------
+@app.on_event("startup")
+async def start_candle_writer():
+    app.state.candle_writer_task = asyncio.create_task(candle_writer.run())
+
+# -------------------------
+# Startup: release symbol streams nobody uses anymore
+# -------------------------
+@app.on_event("startup")
+async def start_idle_stream_sweeper():
+    app.state.idle_stream_sweeper_task = asyncio.create_task(handlers.run_idle_stream_sweeper())
+
+# -------------------------
+# Startup: Redis pub/sub bridge (trades, leaderboard, prices across workers)
+# -------------------------
+@app.on_event("startup")
+async def start_stream_bridge():
+    handlers.stream_handler.start()
+
+# -------------------------
+# Startup: market data via the elected ingestor (MARKET_DATA_MODE=ingestor)
+# -------------------------
+@app.on_event("startup")
+async def start_market_feed():
+    app.state.market_ingestor = None
+    if settings.MARKET_DATA_MODE != "ingestor":
+        return
+    
+    handlers.market_feed.start()
+    
+    # Every worker is an ingestor candidate; the lease elects exactly one
+    app.state.market_ingestor = MarketIngestor(settings.REDIS_URL)
+    app.state.market_ingestor.start()
+
+# -------------------------
+# Shutdown: release pooled Binance REST and candle cache connections
+# -------------------------
+@app.on_event("shutdown")
+async def close_binance_rest():
+    await get_binance_service().rest.close()
+    await candle_service.redis.close()
+
+# -------------------------
+# Shutdown: stop the Redis pub/sub bridge
+# -------------------------
+@app.on_event("shutdown")
+async def stop_stream_bridge():
+    await handlers.stream_handler.stop()
+
+# -------------------------
+# Shutdown: step down as ingestor and stop reading market streams
+# -------------------------
+@app.on_event("shutdown")
+async def stop_market_feed():
+    if app.state.market_ingestor is not None:
+        await app.state.market_ingestor.stop()
+    await handlers.market_feed.stop()
+
+# -------------------------
+# Shutdown: stop tick workers and their thread pool
+# -------------------------
+@app.on_event("shutdown")
+def stop_tick_pipeline():
+    handlers.price_conflator.stop()
+    handlers.tick_pipeline.shutdown()
+    app.state.pnl_snapshot_task.cancel()
+    app.state.candle_writer_task.cancel()
+    app.state.idle_stream_sweeper_task.cancel()
+    app.state.order_index_reconcile_task.cancel()
 
 # -------------------------
 # Root endpoint
@@ -5,6 +5,7 @@ from .trade import Trade
 from .position import Position
 from .demo_wallet import DemoWallet
 from .demo_order import DemoOrder
+from .candle import Candle
 
 __all__ = [
     "User",
@@ -14,4 +15,5 @@ __all__ = [
     "Position",
     "DemoWallet",
     "DemoOrder",
+    "Candle",
 ]
\ No newline at end of file
@@ -0,0 +1,15 @@
+from sqlalchemy import Column, String, Float, BigInteger
+from ..db import Base
+
+class Candle(Base):
+    __tablename__ = "candles"
+    
+    # Composite key doubles as the (symbol, interval, open_time) range index
+    symbol = Column(String, primary_key=True)  # e.g., "BTCUSDT"
+    interval = Column(String, primary_key=True)  # "1m", "5m", "1h", ...
+    open_time = Column(BigInteger, primary_key=True)  # Unix seconds
+    open = Column(Float, nullable=False)
+    high = Column(Float, nullable=False)
+    low = Column(Float, nullable=False)
+    close = Column(Float, nullable=False)
+    volume = Column(Float, nullable=False, default=0.0)
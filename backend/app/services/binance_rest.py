@@ -0,0 +1,92 @@
+"""
+Asyncio-native Binance REST client
+Used inside async endpoints and coroutines so REST calls never block the event loop
+"""
+import asyncio
+from typing import Dict, List, Optional
+import httpx
+from ..config import settings
+from ..utils.logger import logger
+
+
+class AsyncBinanceRest:
+    """
+    Thin async wrapper over the public Binance REST endpoints we use.
+
+    - One pooled keep-alive httpx.AsyncClient per process
+    - Per-request timeout (BINANCE_REST_TIMEOUT)
+    - At most BINANCE_REST_MAX_CONCURRENCY requests in flight
+    """
+
+    def __init__(self, base_url: str):
+        self.base_url = base_url
+        self._client: Optional[httpx.AsyncClient] = None
+        self._semaphore = asyncio.Semaphore(settings.BINANCE_REST_MAX_CONCURRENCY)
+
+    def _get_client(self) -> httpx.AsyncClient:
+        # Created lazily so it binds to the running event loop
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                timeout=settings.BINANCE_REST_TIMEOUT,
+                limits=httpx.Limits(
+                    max_connections=settings.BINANCE_REST_MAX_CONCURRENCY,
+                    max_keepalive_connections=settings.BINANCE_REST_MAX_CONCURRENCY
+                )
+            )
+        return self._client
+
+    async def _get(self, path: str, params: Optional[Dict] = None):
+        async with self._semaphore:
+            response = await self._get_client().get(path, params=params)
+
+        if response.status_code != 200:
+            logger.error(f"Binance REST {path} failed ({response.status_code}): {response.text}")
+        response.raise_for_status()
+        return response.json()
+
+    async def get_klines(
+        self,
+        symbol: str,
+        interval: str,
+        limit: int = 500,
+        start_time: Optional[int] = None,
+        end_time: Optional[int] = None
+    ) -> List[list]:
+        """GET /api/v3/klines (start_time/end_time in milliseconds)"""
+        params = {"symbol": symbol, "interval": interval, "limit": limit}
+        if start_time is not None:
+            params["startTime"] = start_time
+        if end_time is not None:
+            params["endTime"] = end_time
+        return await self._get("/api/v3/klines", params)
+
+    async def get_ticker_price(self, symbol: str) -> float:
+        """GET /api/v3/ticker/price"""
+        data = await self._get("/api/v3/ticker/price", {"symbol": symbol})
+        return float(data["price"])
+
+    async def get_exchange_info(self, symbol: Optional[str] = None) -> Dict:
+        """GET /api/v3/exchangeInfo"""
+        params = {"symbol": symbol} if symbol else None
+        return await self._get("/api/v3/exchangeInfo", params)
+
+    async def get_agg_trades(
+        self,
+        symbol: str,
+        start_time: Optional[int] = None,
+        from_id: Optional[int] = None,
+        limit: int = 1000
+    ) -> List[Dict]:
+        """GET /api/v3/aggTrades (page by start_time or from_id)"""
+        params = {"symbol": symbol, "limit": limit}
+        if from_id is not None:
+            params["fromId"] = from_id
+        elif start_time is not None:
+            params["startTime"] = start_time
+        return await self._get("/api/v3/aggTrades", params)
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
@@ -1,124 +1,366 @@
 """
 Async-compatible Binance WebSocket service
 Uses websockets library directly to avoid event loop conflicts
+
+All symbols share a small pool of combined-stream connections
+(see CombinedStreamConnection) instead of one socket per stream.
 """
 from binance.client import Client
-from typing import Callable, Dict, Optional
+from requests.adapters import HTTPAdapter
+from typing import Awaitable, Callable, Dict, List, Optional, Set
 import asyncio
 import json
+import random
+import time
 import websockets
 from threading import Lock
+from .binance_rest import AsyncBinanceRest
 from ..config import settings
 from ..utils.logger import logger
 
 
+def rest_base_url() -> str:
+    """Binance REST base URL for the configured network"""
+    if settings.BINANCE_REST_URL:
+        return settings.BINANCE_REST_URL
+    if settings.BINANCE_TESTNET:
+        return "https://testnet.binance.vision"
+    return "https://api.binance.com"
+
+
+# Binance's hard limit of streams on one WebSocket connection
+BINANCE_MAX_STREAMS_PER_SOCKET = 1024
+
+
 class BinanceService:
     def __init__(self):
-        self.client = Client(settings.BINANCE_API_KEY, settings.BINANCE_API_SECRET)
+        # REST must hit the same network as the WebSocket: trade ids and
+        # prices of testnet and mainnet are unrelated
+        self.client = Client(
+            settings.BINANCE_API_KEY,
+            settings.BINANCE_API_SECRET,
+            testnet=settings.BINANCE_TESTNET
+        )
+        
+        # Keep-alive connection pool shared by every REST call on this client
+        adapter = HTTPAdapter(
+            pool_connections=settings.BINANCE_HTTP_POOL_SIZE,
+            pool_maxsize=settings.BINANCE_HTTP_POOL_SIZE
+        )
+        self.client.session.mount("https://", adapter)
+        
+        # Non-blocking REST client for use inside coroutines
+        self.rest = AsyncBinanceRest(rest_base_url())
         
         # 📊 Cache latest prices for instant access
         self.latest_prices: Dict[str, float] = {}
         self.latest_ticker_data: Dict[str, dict] = {}
         
+        # time.monotonic() of the last update per symbol (staleness bound)
+        self._price_updated_at: Dict[str, float] = {}
+        
         # 🔒 Thread-safe locks for cache updates
         self._price_lock = Lock()
         self._ticker_lock = Lock()
         
-        # Active WebSocket tasks
-        self.active_tasks: Dict[str, asyncio.Task] = {}
+        # Shared combined-stream connections and which one carries each stream
+        self.connections: List[CombinedStreamConnection] = []
+        self.active_streams: Dict[str, CombinedStreamConnection] = {}
+        
+        # Last (trade_id, trade_time_ms) seen per symbol, used for gap backfill
+        self._last_trade: Dict[str, tuple] = {}
         
-        # WebSocket URL (Binance Spot Testnet or Mainnet)
+        # (trade_id, trade_time_ms) of the last trade replayed by a backfill;
+        # live ticks up to it are duplicates. Cleared by the first newer tick.
+        self._replayed_through: Dict[str, tuple] = {}
+        
+        # Symbols whose last backfill missed part of the gap (truncated,
+        # timed out or failed); their next live tick is flagged gap_before
+        self._gap_before: Set[str] = set()
+        
+        # Combined-stream WebSocket URL (Binance Spot Testnet or Mainnet)
         if settings.BINANCE_TESTNET:
-            self.ws_url = "wss://testnet.binance.vision/ws"
+            self.ws_url = "wss://testnet.binance.vision/stream"
         else:
-            self.ws_url = "wss://stream.binance.com:9443/ws"
+            self.ws_url = "wss://stream.binance.com:9443/stream"
+    
+    def get_cached_price(self, symbol: str, max_age: Optional[float] = None) -> Optional[float]:
+        """
+        Last streamed price for a symbol, or None if it is older than
+        max_age seconds (default: PRICE_MAX_STALENESS_SECONDS).
+        """
+        if max_age is None:
+            max_age = settings.PRICE_MAX_STALENESS_SECONDS
+        
+        with self._price_lock:
+            price = self.latest_prices.get(symbol)
+            updated_at = self._price_updated_at.get(symbol)
+        
+        if price is None or updated_at is None:
+            return None
+        if time.monotonic() - updated_at > max_age:
+            return None
+        return price
     
     def get_current_price(self, symbol: str) -> Optional[float]:
-        """Get current price via REST API with fallback to cache"""
+        """
+        Price oracle used for order placement.
+        
+        Flow:
+        1. Serve the last streamed trade price if it is fresh enough.
+        2. Otherwise make one REST ticker call and cache its result, so
+           unstreamed symbols also stay off REST within the staleness window.
+        3. If REST fails, fall back to the (stale) cached price.
+        """
+        price = self.get_cached_price(symbol)
+        if price is not None:
+            return price
+        
         try:
             ticker = self.client.get_symbol_ticker(symbol=symbol)
             price = float(ticker['price'])
             
-            with self._price_lock:
-                self.latest_prices[symbol] = price
+            self._update_price_cache(symbol, price)
             
             logger.info(f"✅ Fetched {symbol} price: ${price}")
             return price
         
         except Exception as e:
-            logger.warning(f"Failed to fetch price for {symbol}: {e}. Using cached price.")
-            # Return cached price if available
-            with self._price_lock:
-                if symbol in self.latest_prices:
-                    return self.latest_prices[symbol]
-            logger.error(f"❌ No cached price available for {symbol}")
-            return None
+            return self._fallback_price(symbol, e)
+    
+    async def aget_current_price(self, symbol: str) -> Optional[float]:
+        """Async price oracle: same as get_current_price but awaits REST"""
+        price = self.get_cached_price(symbol)
+        if price is not None:
+            return price
+        
+        try:
+            price = await self.rest.get_ticker_price(symbol)
+            
+            self._update_price_cache(symbol, price)
+            
+            logger.info(f"✅ Fetched {symbol} price: ${price}")
+            return price
+        
+        except Exception as e:
+            return self._fallback_price(symbol, e)
     
-    def get_klines(self, symbol: str, interval: str, limit: int = 100):
-        """Get candlestick data via REST API"""
-        return self.client.get_klines(symbol=symbol, interval=interval, limit=limit)
+    def _fallback_price(self, symbol: str, error: Exception) -> Optional[float]:
+        """Return the cached price (however old) when REST fails"""
+        logger.warning(f"Failed to fetch price for {symbol}: {error}. Using cached price.")
+        with self._price_lock:
+            if symbol in self.latest_prices:
+                return self.latest_prices[symbol]
+        logger.error(f"❌ No cached price available for {symbol}")
+        return None
+    
+    def get_klines(
+        self,
+        symbol: str,
+        interval: str,
+        limit: int = 100,
+        start_time: Optional[int] = None,
+        end_time: Optional[int] = None
+    ):
+        """Get candlestick data via REST API (start/end in milliseconds)"""
+        params = {"symbol": symbol, "interval": interval, "limit": limit}
+        if start_time is not None:
+            params["startTime"] = start_time
+        if end_time is not None:
+            params["endTime"] = end_time
+        return self.client.get_klines(**params)
+    
+    async def aget_klines(
+        self,
+        symbol: str,
+        interval: str,
+        limit: int = 100,
+        start_time: Optional[int] = None,
+        end_time: Optional[int] = None
+    ):
+        """Get candlestick data without blocking the event loop"""
+        return await self.rest.get_klines(symbol, interval, limit, start_time, end_time)
     
     def _update_price_cache(self, symbol: str, price: float):
         """Thread-safe price cache update"""
         with self._price_lock:
             self.latest_prices[symbol] = price
+            self._price_updated_at[symbol] = time.monotonic()
     
-    async def subscribe_to_ticker(self, symbol: str, callback: Callable):
+    def _mark_price_stale(self, symbol: str):
+        """Keep the cached price (REST fallback) but stop serving it as fresh"""
+        with self._price_lock:
+            self._price_updated_at.pop(symbol, None)
+    
+    def _parse_ticker(self, data: dict) -> dict:
+        """Normalize a 24hr ticker event and update the caches"""
+        ticker_data = {
+            'symbol': data['s'],
+            'price': float(data['c']),
+            'open': float(data['o']),
+            'high': float(data['h']),
+            'low': float(data['l']),
+            'volume': float(data['v']),
+            'price_change': float(data['p']),
+            'price_change_percent': float(data['P']),
+            'timestamp': data['E']
+        }
+        
+        self._update_price_cache(data['s'], ticker_data['price'])
+        
+        with self._ticker_lock:
+            self.latest_ticker_data[data['s']] = ticker_data
+        
+        return ticker_data
+    
+    def _parse_trade(self, data: dict) -> dict:
+        """Normalize a trade tick event and update the price cache"""
+        trade_data = {
+            'symbol': data['s'],
+            'price': float(data['p']),
+            'quantity': float(data['q']),
+            'timestamp': data['T'],
+            'is_buyer_maker': data['m'],
+            'trade_id': data['t']
+        }
+        
+        self._record_trade(trade_data)
+        return trade_data
+    
+    def _record_trade(self, trade_data: dict):
+        """Update the price cache and the backfill watermark for a trade"""
+        self._update_price_cache(trade_data['symbol'], trade_data['price'])
+        
+        self._last_trade[trade_data['symbol']] = (trade_data['trade_id'], trade_data['timestamp'])
+    
+    def ingest_trade(self, trade_data: dict):
+        """Record a normalized trade received from the market-data ingestor"""
+        self._record_trade(trade_data)
+    
+    async def _backfill_trades(self, symbol: str, callback: Callable):
         """
-        Subscribe to 24hr ticker updates (async-compatible)
+        Replay trades missed while the socket was down.
+        
+        Flow:
+        1. Start from the last trade seen before the disconnect.
+        2. Page through REST aggTrades (1000 per call) until caught up or
+           BINANCE_BACKFILL_MAX_TRADES is reached.
+        3. Feed each trade through the normal callback, oldest first, so
+           candles and SL/TP checks see the prices of the gap.
+        
+        Replayed prices are history: they advance the trade watermark but
+        never the price cache, and the symbol's cached price counts as stale
+        until live trades resume (price lookups go to REST meanwhile).
+        
+        Returns False if the gap was cut short at BINANCE_BACKFILL_MAX_TRADES.
         """
-        symbol_lower = symbol.lower()
-        stream_name = f"{symbol_lower}@ticker"
+        last = self._last_trade.get(symbol)
+        if last is None:
+            return True
         
-        if stream_name in self.active_tasks:
-            logger.info(f"Already subscribed to {symbol}")
-            return
+        self._mark_price_stale(symbol)
+        
+        last_trade_id, last_time = last
+        from_id = None
+        replayed = 0
+        complete = False
         
-        async def ticker_listener():
-            url = f"{self.ws_url}/{stream_name}"
-            logger.info(f"Connecting to Binance: {url}")
+        while replayed < settings.BINANCE_BACKFILL_MAX_TRADES:
+            agg_trades = await self.rest.get_agg_trades(symbol, start_time=last_time, from_id=from_id)
             
-            try:
-                async with websockets.connect(url) as ws:
-                    logger.info(f"✅ Connected to Binance ticker for {symbol}")
-                    
-                    while True:
-                        try:
-                            message = await ws.recv()
-                            data = json.loads(message)
-                            
-                            ticker_data = {
-                                'symbol': data['s'],
-                                'price': float(data['c']),
-                                'open': float(data['o']),
-                                'high': float(data['h']),
-                                'low': float(data['l']),
-                                'volume': float(data['v']),
-                                'price_change': float(data['p']),
-                                'price_change_percent': float(data['P']),
-                                'timestamp': data['E']
-                            }
-                            
-                            with self._price_lock:
-                                self.latest_prices[data['s']] = ticker_data['price']
-                            
-                            with self._ticker_lock:
-                                self.latest_ticker_data[data['s']] = ticker_data
-                            
-                            callback(ticker_data)
-                        
-                        except websockets.exceptions.ConnectionClosed:
-                            logger.warning(f"Binance connection closed for {symbol}")
-                            break
-                        except Exception as e:
-                            logger.error(f"Error processing ticker: {e}")
+            for agg in agg_trades:
+                # aggTrade 'l' is the id of the last raw trade it contains
+                if agg['l'] <= last_trade_id:
+                    continue
+                
+                trade_data = {
+                    'symbol': symbol,
+                    'price': float(agg['p']),
+                    'quantity': float(agg['q']),
+                    'timestamp': agg['T'],
+                    'is_buyer_maker': agg['m'],
+                    'trade_id': agg['l'],
+                    'backfill': True
+                }
+                self._last_trade[symbol] = (agg['l'], agg['T'])
+                self._replayed_through[symbol] = (agg['l'], agg['T'])
+                last_trade_id = agg['l']
+                callback(trade_data)
+                replayed += 1
             
-            except Exception as e:
-                logger.error(f"Failed to connect to Binance: {e}")
-                raise
+            if len(agg_trades) < 1000:
+                complete = True
+                break
+            from_id = agg_trades[-1]['a'] + 1
         
-        task = asyncio.create_task(ticker_listener())
-        self.active_tasks[stream_name] = task
+        if not complete:
+            logger.warning(
+                f"⚠️ Backfill for {symbol} stopped at {replayed} trades "
+                f"(BINANCE_BACKFILL_MAX_TRADES); the rest of the gap is missing"
+            )
+        else:
+            logger.info(f"🩹 Backfilled {replayed} trades for {symbol} after reconnect")
+        return complete
+    
+    def _connection_for(self, stream_name: str) -> "CombinedStreamConnection":
+        """
+        Pick the pooled connection that should carry a stream.
+        
+        Fills connections up to BINANCE_WS_STREAMS_PER_CONNECTION before opening
+        another one, and never opens more than BINANCE_WS_MAX_CONNECTIONS.
+        Once the pool is full, overflow goes to the least loaded socket up to
+        Binance's per-connection limit; beyond that the stream is rejected.
+        """
+        for conn in self.connections:
+            if conn.stream_count < settings.BINANCE_WS_STREAMS_PER_CONNECTION:
+                return conn
+        
+        if len(self.connections) < settings.BINANCE_WS_MAX_CONNECTIONS:
+            conn = CombinedStreamConnection(self.ws_url, name=f"binance-{len(self.connections)}")
+            self.connections.append(conn)
+            return conn
+        
+        conn = min(self.connections, key=lambda c: c.stream_count)
+        if conn.stream_count >= BINANCE_MAX_STREAMS_PER_SOCKET:
+            raise RuntimeError(f"No Binance stream capacity left for {stream_name}")
+        return conn
+    
+    async def _subscribe_stream(
+        self,
+        stream_name: str,
+        handler: Callable[[dict], None],
+        resync: Optional[Callable[[], Awaitable]] = None
+    ):
+        """Attach a stream handler to a pooled combined-stream connection"""
+        if stream_name in self.active_streams:
+            logger.info(f"Already subscribed to {stream_name}")
+            return
+        
+        conn = self._connection_for(stream_name)
+        self.active_streams[stream_name] = conn
+        await conn.add_stream(stream_name, handler, resync)
+    
+    async def unsubscribe(self, symbol: str, stream_type: str = "trade"):
+        """
+        Remove a symbol stream from its shared connection (UNSUBSCRIBE frame).
+        The socket itself is closed once it carries no streams.
+        """
+        stream_name = f"{symbol.lower()}@{stream_type}"
+        conn = self.active_streams.pop(stream_name, None)
+        if conn is None:
+            return
+        
+        await conn.remove_stream(stream_name)
+        logger.info(f"🛑 Unsubscribed from {stream_name}")
+    
+    async def subscribe_to_ticker(self, symbol: str, callback: Callable):
+        """
+        Subscribe to 24hr ticker updates (async-compatible)
+        """
+        def on_ticker(data: dict):
+            callback(self._parse_ticker(data))
+        
+        await self._subscribe_stream(f"{symbol.lower()}@ticker", on_ticker)
         logger.info(f"✅ Subscribed to TICKER for {symbol}")
 
     async def subscribe_to_trade(self, symbol: str, callback: Callable):
@@ -128,53 +370,302 @@ class BinanceService:
         ⚡ MUCH FASTER - receives updates in milliseconds
         📈 Best for real-time trading
         """
-        symbol_lower = symbol.lower()
-        stream_name = f"{symbol_lower}@trade"
+        def on_trade(data: dict):
+            replayed = self._replayed_through.get(data['s'])
+            if replayed is not None:
+                if data['t'] <= replayed[0] and data['T'] <= replayed[1]:
+                    # Already delivered by the post-reconnect backfill
+                    return
+                # Past the backfill window (or ids that don't line up):
+                # live ticks are authoritative again
+                del self._replayed_through[data['s']]
+            trade_data = self._parse_trade(data)
+            if data['s'] in self._gap_before:
+                self._gap_before.discard(data['s'])
+                trade_data['gap_before'] = True
+            callback(trade_data)
+        
+        async def resync():
+            complete = False
+            try:
+                complete = await self._backfill_trades(symbol.upper(), callback)
+            finally:
+                if not complete:
+                    self._gap_before.add(symbol.upper())
+        
+        await self._subscribe_stream(f"{symbol.lower()}@trade", on_trade, resync)
+        logger.info(f"✅ Subscribed to TRADE TICKS for {symbol}")
+
+
+# -------------------------
+# Process-wide shared instance
+# -------------------------
+_shared_service: Optional[BinanceService] = None
+_shared_lock = Lock()
+
+
+def get_binance_service() -> BinanceService:
+    """
+    Returns the application-scoped BinanceService (also usable as a FastAPI
+    dependency). Building a Client pings Binance and opens a new HTTP
+    session, so it happens once per process instead of once per request.
+    """
+    global _shared_service
+    
+    if _shared_service is None:
+        with _shared_lock:
+            if _shared_service is None:
+                _shared_service = BinanceService()
+    
+    return _shared_service
+
+
+class CombinedStreamConnection:
+    """
+    One multiplexed Binance WebSocket carrying many streams.
+    
+    Flow:
+    1. Connects to the combined endpoint (/stream?streams=a@trade/b@trade).
+    2. Streams added or removed later are queued and sent as batched
+       SUBSCRIBE/UNSUBSCRIBE frames (one frame per method, many streams in
+       `params`) on the open socket, at most one frame per
+       BINANCE_WS_MIN_SEND_INTERVAL, instead of opening a new connection.
+    3. Every message arrives wrapped as {"stream": ..., "data": ...} and is
+       dispatched to the handler registered for that stream.
+    4. If the socket drops it reconnects with jittered exponential backoff and
+       runs every stream's resync hook (REST backfill) concurrently. The
+       reader keeps draining meanwhile: live messages of a stream still
+       being backfilled are buffered and delivered right after its gap.
+    """
+    
+    def __init__(self, base_url: str, name: str):
+        self.base_url = base_url
+        self.name = name
+        
+        # {stream_name: handler(data)}
+        self.handlers: Dict[str, Callable[[dict], None]] = {}
+        
+        # {stream_name: async resync()} - called after a reconnect
+        self.resync_hooks: Dict[str, Callable[[], Awaitable]] = {}
+        
+        # {stream_name: live messages held back while its backfill runs}
+        self._held: Dict[str, List[dict]] = {}
+        
+        self._ws = None
+        self._task: Optional[asyncio.Task] = None
+        self._request_id = 0
+        
+        # Streams waiting for the next batched SUBSCRIBE / UNSUBSCRIBE frame
+        self._pending_subscribe: Set[str] = set()
+        self._pending_unsubscribe: Set[str] = set()
+        self._flush_task: Optional[asyncio.Task] = None
+        self._last_send = 0.0
+    
+    @property
+    def stream_count(self) -> int:
+        return len(self.handlers)
+    
+    async def add_stream(
+        self,
+        stream_name: str,
+        handler: Callable[[dict], None],
+        resync: Optional[Callable[[], Awaitable]] = None
+    ):
+        self.handlers[stream_name] = handler
+        if resync is not None:
+            self.resync_hooks[stream_name] = resync
+        
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+        elif self._ws is not None:
+            self._pending_unsubscribe.discard(stream_name)
+            self._pending_subscribe.add(stream_name)
+            self._schedule_flush()
+        # Otherwise the socket is still connecting and picks the stream up on open
+    
+    async def remove_stream(self, stream_name: str):
+        self.handlers.pop(stream_name, None)
+        self.resync_hooks.pop(stream_name, None)
+        self._held.pop(stream_name, None)
+        
+        if not self.handlers:
+            await self.close()
+        elif stream_name in self._pending_subscribe:
+            # Never sent, nothing to undo
+            self._pending_subscribe.discard(stream_name)
+        elif self._ws is not None:
+            self._pending_unsubscribe.add(stream_name)
+            self._schedule_flush()
+    
+    async def close(self):
+        if self._task and not self._task.done():
+            self._task.cancel()
+        if self._flush_task and not self._flush_task.done():
+            self._flush_task.cancel()
+        self._task = None
+        self._flush_task = None
+        self._ws = None
+        self._pending_subscribe.clear()
+        self._pending_unsubscribe.clear()
+        logger.info(f"Closed Binance connection {self.name}")
+    
+    def _schedule_flush(self):
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self._flush_pending())
+    
+    async def _flush_pending(self):
+        """Send queued changes as batched frames, rate limited per socket"""
+        while self._ws is not None and (self._pending_subscribe or self._pending_unsubscribe):
+            # Wait for the send slot first, so everything queued meanwhile
+            # goes out in the same frame
+            delay = self._last_send + settings.BINANCE_WS_MIN_SEND_INTERVAL - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            if self._ws is None:
+                break
+            
+            if self._pending_unsubscribe:
+                method, params = "UNSUBSCRIBE", sorted(self._pending_unsubscribe)
+                self._pending_unsubscribe.clear()
+            else:
+                method, params = "SUBSCRIBE", sorted(self._pending_subscribe)
+                self._pending_subscribe.clear()
+            
+            self._last_send = time.monotonic()
+            await self._send_method(method, params)
+    
+    async def _send_method(self, method: str, params: List[str]):
+        self._request_id += 1
+        try:
+            await self._ws.send(json.dumps({
+                "method": method,
+                "params": params,
+                "id": self._request_id
+            }))
+        except Exception as e:
+            # The listener notices the dead socket and stops on its own
+            logger.error(f"Failed to send {method} {params} on {self.name}: {e}")
+    
+    def _dispatch(self, message: str):
+        payload = json.loads(message)
+        
+        stream_name = payload.get("stream")
+        if stream_name is None:
+            # Reply to a SUBSCRIBE/UNSUBSCRIBE request
+            if payload.get("error"):
+                logger.error(f"Binance rejected request on {self.name}: {payload['error']}")
+            return
+        
+        held = self._held.get(stream_name)
+        if held is not None:
+            held.append(payload["data"])
+            return
+        
+        handler = self.handlers.get(stream_name)
+        if handler is not None:
+            handler(payload["data"])
+    
+    async def _resync(self):
+        """
+        Backfill every stream's missed window after a reconnect.
+        Runs beside the reader; REST concurrency is bounded by the REST
+        client's semaphore and each backfill by BINANCE_BACKFILL_TIMEOUT.
+        """
+        hooks = list(self.resync_hooks.items())
+        for stream_name, _ in hooks:
+            self._held[stream_name] = []
         
-        if stream_name in self.active_tasks:
-            logger.info(f"Already subscribed to {symbol}")
+        await asyncio.gather(*(self._resync_stream(stream_name, resync) for stream_name, resync in hooks))
+    
+    async def _resync_stream(self, stream_name: str, resync: Callable[[], Awaitable]):
+        try:
+            await asyncio.wait_for(resync(), timeout=settings.BINANCE_BACKFILL_TIMEOUT)
+        except asyncio.CancelledError:
+            raise
+        except asyncio.TimeoutError:
+            logger.warning(f"Backfill for {stream_name} timed out, resuming live data")
+        except Exception as e:
+            logger.error(f"Backfill failed for {stream_name}: {e}")
+        
+        # Release the live messages that arrived during the backfill, in order
+        held = self._held.pop(stream_name, [])
+        handler = self.handlers.get(stream_name)
+        if handler is None:
             return
+        for data in held:
+            try:
+                handler(data)
+            except Exception as e:
+                logger.error(f"Error processing message on {self.name}: {e}")
+    
+    def _backoff_delay(self, attempt: int) -> float:
+        """Exponential backoff with jitter, capped at BINANCE_RECONNECT_MAX_DELAY"""
+        ceiling = min(
+            settings.BINANCE_RECONNECT_MAX_DELAY,
+            settings.BINANCE_RECONNECT_BASE_DELAY * (2 ** min(attempt, 16))
+        )
+        return ceiling / 2 + random.uniform(0, ceiling / 2)
+    
+    async def _run(self):
+        """
+        Supervised listener loop.
+        Keeps reconnecting until every stream has been removed.
+        """
+        attempt = 0
+        has_connected = False
+        resync_task: Optional[asyncio.Task] = None
         
-        async def trade_listener():
-            url = f"{self.ws_url}/{stream_name}"
-            logger.info(f"Connecting to Binance trades: {url}")
+        while self.handlers:
+            streams = list(self.handlers)
+            url = f"{self.base_url}?streams={'/'.join(streams)}"
+            logger.info(f"Connecting to Binance combined stream {self.name} ({len(streams)} streams)")
             
             try:
                 async with websockets.connect(url) as ws:
-                    logger.info(f"✅ Connected to Binance TRADES for {symbol}")
+                    self._ws = ws
+                    attempt = 0
+                    logger.info(f"✅ Connected to Binance {self.name}")
+                    
+                    # The URL carries every stream; only changes made while
+                    # the handshake was in flight still need a frame
+                    self._last_send = time.monotonic()
+                    self._pending_subscribe = {s for s in self.handlers if s not in streams}
+                    self._pending_unsubscribe = {s for s in streams if s not in self.handlers}
+                    self._schedule_flush()
                     
-                    while True:
+                    # Gaps are replayed in the background; live messages of
+                    # those streams are held back meanwhile, so callbacks
+                    # still see trades in order
+                    if has_connected:
+                        resync_task = asyncio.create_task(self._resync())
+                    has_connected = True
+                    
+                    async for message in ws:
                         try:
-                            message = await ws.recv()
-                            data = json.loads(message)
-                            
-                            # Parse trade tick data
-                            trade_data = {
-                                'symbol': data['s'],
-                                'price': float(data['p']),
-                                'quantity': float(data['q']),
-                                'timestamp': data['T'],
-                                'is_buyer_maker': data['m'],
-                                'trade_id': data['t']
-                            }
-                            
-                            # Update cache
-                            with self._price_lock:
-                                self.latest_prices[data['s']] = trade_data['price']
-                            
-                            # Call callback
-                            callback(trade_data)
-                        
-                        except websockets.exceptions.ConnectionClosed:
-                            logger.warning(f"Binance connection closed for {symbol}")
-                            break
+                            self._dispatch(message)
                         except Exception as e:
-                            logger.error(f"Error processing trade: {e}")
+                            logger.error(f"Error processing message on {self.name}: {e}")
             
-            except Exception as e:
-                logger.error(f"Failed to connect to Binance trades: {e}")
+            except websockets.exceptions.ConnectionClosed:
+                logger.warning(f"Binance connection {self.name} closed")
+            except asyncio.CancelledError:
                 raise
-        
-        task = asyncio.create_task(trade_listener())
-        self.active_tasks[stream_name] = task
-        logger.info(f"✅ Subscribed to TRADE TICKS for {symbol}")
\ No newline at end of file
+            except Exception as e:
+                logger.error(f"Binance connection {self.name} failed: {e}")
+            finally:
+                self._ws = None
+                
+                # A new gap opened; the next reconnect backfills from the
+                # last delivered trade, so held messages can be discarded
+                if resync_task is not None:
+                    resync_task.cancel()
+                    resync_task = None
+                self._held.clear()
+            
+            if not self.handlers:
+                break
+            
+            delay = self._backoff_delay(attempt)
+            attempt += 1
+            logger.warning(f"🔁 Reconnecting {self.name} in {delay:.1f}s (attempt {attempt})")
+            await asyncio.sleep(delay)
@@ -1,4 +1,411 @@
+import time
+import asyncio
+from array import array
+from threading import Lock
+from typing import Callable, Dict, List, Optional, Set, Tuple
+from ..config import settings
+from ..utils.logger import logger
+
+# Supported chart intervals (seconds per bar)
+INTERVAL_SECONDS = {
+    '1m': 60, '3m': 180, '5m': 300,
+    '15m': 900, '30m': 1800, '1h': 3600
+}
+
+
+class CandleRing:
+    """
+    Fixed-capacity OHLCV ring buffer backed by typed arrays.
+    Oldest bars are overwritten once `capacity` is reached.
+    """
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.time = array('q', [0]) * capacity  # bar open time, unix seconds
+        self.open = array('d', [0.0]) * capacity
+        self.high = array('d', [0.0]) * capacity
+        self.low = array('d', [0.0]) * capacity
+        self.close = array('d', [0.0]) * capacity
+        self.volume = array('d', [0.0]) * capacity
+        self._start = 0
+        self.size = 0
+
+    def _pos(self, i: int) -> int:
+        return (self._start + i) % self.capacity
+
+    def last_time(self) -> Optional[int]:
+        if self.size == 0:
+            return None
+        return self.time[self._pos(self.size - 1)]
+
+    def last_close(self) -> Optional[float]:
+        if self.size == 0:
+            return None
+        return self.close[self._pos(self.size - 1)]
+
+    def append(self, t: int, o: float, h: float, l: float, c: float, v: float):
+        if self.size < self.capacity:
+            pos = self._pos(self.size)
+            self.size += 1
+        else:
+            pos = self._start
+            self._start = (self._start + 1) % self.capacity
+
+        self.time[pos] = t
+        self.open[pos] = o
+        self.high[pos] = h
+        self.low[pos] = l
+        self.close[pos] = c
+        self.volume[pos] = v
+
+    def update_last(self, price: float, quantity: float):
+        """Apply a trade to the bar in progress"""
+        pos = self._pos(self.size - 1)
+        if price > self.high[pos]:
+            self.high[pos] = price
+        if price < self.low[pos]:
+            self.low[pos] = price
+        self.close[pos] = price
+        self.volume[pos] += quantity
+
+    def merge_last(self, h: float, l: float, c: float, v: float):
+        """Merge another view of the bar in progress (e.g. live into REST)"""
+        pos = self._pos(self.size - 1)
+        self.high[pos] = max(self.high[pos], h)
+        self.low[pos] = min(self.low[pos], l)
+        self.close[pos] = c
+        self.volume[pos] = max(self.volume[pos], v)
+
+    def bar(self, i: int) -> Dict:
+        pos = self._pos(i)
+        return {
+            "time": self.time[pos],
+            "open": self.open[pos],
+            "high": self.high[pos],
+            "low": self.low[pos],
+            "close": self.close[pos],
+            "volume": self.volume[pos]
+        }
+
+    def to_list(self, limit: Optional[int] = None) -> List[Dict]:
+        """Newest `limit` bars (all if None), oldest first"""
+        count = self.size if limit is None else min(limit, self.size)
+        return [self.bar(i) for i in range(self.size - count, self.size)]
+
+    def clear(self):
+        self._start = 0
+        self.size = 0
+
+
 class CandleBuilder:
-    def build_candles(self, trades: list, interval: str):
-        """Build candlestick data from trades"""
-        pass
+    """
+    Streaming OHLCV aggregator fed by the trade stream.
+
+    Flow:
+    1. add_trade() is called for every trade tick of a tracked symbol and
+       updates the bar in progress of every interval (1m ... 1h).
+    2. Intervals without trades get flat bars (previous close, zero volume),
+       matching Binance klines.
+    3. The first REST fetch for a symbol/interval seeds the ring with
+       history (seed); after that get_candles() serves the tail from memory.
+    4. Every bar that closes is handed to the close listeners
+       (symbol, interval, bar). The first live bar of an unseeded ring only
+       saw part of its interval and is not reported.
+    5. A trade flagged gap_before follows trades the feed could not replay
+       (truncated or failed reconnect backfill). The bars since the last
+       trade can't be verified, so they are dropped unreported instead of
+       being closed or filled flat; the ring restarts like an unseeded one.
+    6. Only trades close bars. get_candles() never changes a ring: while
+       the feed is live (a trade within CANDLE_FEED_LIVE_SECONDS) it shows
+       quiet intervals as flat bars in the returned view, otherwise it
+       returns None so callers go to the store / REST instead of charting
+       an outage as flat bars.
+    7. Close events raised off the event loop are handed to the loop bound
+       with bind_loop(), so listeners always run on the loop.
+    """
+
+    def __init__(self, capacity: int = None):
+        self.capacity = capacity or settings.CANDLE_BUFFER_SIZE
+
+        # {(symbol, interval): CandleRing}
+        self._rings: Dict[Tuple[str, str], CandleRing] = {}
+        self._tracked: Set[str] = set()
+        self._lock = Lock()
+
+        # {symbol: monotonic time the last trade arrived}
+        self._last_trade_at: Dict[str, float] = {}
+
+        # {(symbol, interval): open time of a bar that only saw part of its interval}
+        self._partial: Dict[Tuple[str, str], int] = {}
+        self._close_listeners: List[Callable[[str, str, Dict], None]] = []
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def add_close_listener(self, listener: Callable[[str, str, Dict], None]):
+        """Register a callback for every closed bar"""
+        self._close_listeners.append(listener)
+
+    def bind_loop(self, loop: asyncio.AbstractEventLoop):
+        """Event loop the close listeners run on"""
+        self._loop = loop
+
+    def _on_loop(self) -> bool:
+        try:
+            return asyncio.get_running_loop() is self._loop
+        except RuntimeError:
+            return False
+
+    def _emit_closed(self, closed: List[Tuple[str, str, Dict]]):
+        if not closed:
+            return
+
+        if self._loop is not None and not self._on_loop():
+            try:
+                self._loop.call_soon_threadsafe(self._deliver_closed, closed)
+            except RuntimeError:
+                # Loop already closed (shutdown)
+                pass
+            return
+
+        self._deliver_closed(closed)
+
+    def _deliver_closed(self, closed: List[Tuple[str, str, Dict]]):
+        for symbol, interval, bar in closed:
+            for listener in self._close_listeners:
+                try:
+                    listener(symbol, interval, bar)
+                except Exception as e:
+                    logger.error(f"Candle close listener failed for {symbol} {interval}: {e}")
+
+    def track(self, symbol: str):
+        """Start building candles for a symbol fed by the trade stream"""
+        with self._lock:
+            self._tracked.add(symbol.upper())
+
+    def untrack(self, symbol: str):
+        """Stop building candles for a symbol and free its rings"""
+        symbol = symbol.upper()
+        with self._lock:
+            self._tracked.discard(symbol)
+            self._last_trade_at.pop(symbol, None)
+            for key in [key for key in self._rings if key[0] == symbol]:
+                del self._rings[key]
+                self._partial.pop(key, None)
+    
+    def is_tracked(self, symbol: str) -> bool:
+        return symbol.upper() in self._tracked
+
+    def _ring(self, symbol: str, interval: str) -> CandleRing:
+        key = (symbol, interval)
+        ring = self._rings.get(key)
+        if ring is None:
+            ring = CandleRing(self.capacity)
+            self._rings[key] = ring
+        return ring
+
+    def _close_last(self, key: Tuple[str, str], ring: CandleRing, closed: List[Tuple[str, str, Dict]]):
+        """Report the bar in progress as closed (unless it is partial)"""
+        bar = ring.bar(ring.size - 1)
+        if self._partial.get(key) == bar["time"]:
+            # Marker stays until history covers the bar (see closed_bars)
+            return
+        closed.append((key[0], key[1], bar))
+
+    def _roll(self, key: Tuple[str, str], ring: CandleRing, until: int, seconds: int,
+              closed: List[Tuple[str, str, Dict]]):
+        """
+        Close the bar in progress and append flat bars for empty intervals
+        up to (excluding) `until`.
+        """
+        last = ring.last_time()
+        missing = (until - last) // seconds - 1
+
+        if missing >= ring.capacity:
+            # Nothing of the old history would survive anyway
+            ring.clear()
+            self._partial.pop(key, None)
+            return
+
+        self._close_last(key, ring, closed)
+
+        close = ring.last_close()
+        for t in range(last + seconds, until, seconds):
+            ring.append(t, close, close, close, close, 0.0)
+            closed.append((key[0], key[1], ring.bar(ring.size - 1)))
+
+    def add_trade(self, symbol: str, price: float, quantity: float, timestamp_ms: int,
+                  gap_before: bool = False):
+        """Apply one trade to every interval's bar in progress"""
+        symbol = symbol.upper()
+        ts = int(timestamp_ms) // 1000
+        closed: List[Tuple[str, str, Dict]] = []
+
+        with self._lock:
+            if symbol not in self._tracked:
+                return
+
+            self._last_trade_at[symbol] = time.monotonic()
+
+            for interval, seconds in INTERVAL_SECONDS.items():
+                key = (symbol, interval)
+                ring = self._ring(symbol, interval)
+                bucket = ts - ts % seconds
+
+                if gap_before:
+                    ring.clear()
+                    self._partial.pop(key, None)
+                last = ring.last_time()
+
+                if last is not None and bucket > last:
+                    self._roll(key, ring, bucket, seconds, closed)
+                    last = ring.last_time()
+
+                if last is None:
+                    self._partial[key] = bucket
+                    ring.append(bucket, price, price, price, price, quantity)
+                elif bucket > last:
+                    ring.append(bucket, price, price, price, price, quantity)
+                elif bucket == last:
+                    ring.update_last(price, quantity)
+                # Older than the bar in progress: already superseded, ignore
+
+        self._emit_closed(closed)
+
+    def _feed_live(self, symbol: str) -> bool:
+        last = self._last_trade_at.get(symbol)
+        return last is not None and time.monotonic() - last <= settings.CANDLE_FEED_LIVE_SECONDS
+
+    def get_candles(self, symbol: str, interval: str, limit: int) -> Optional[List[Dict]]:
+        """
+        Newest `limit` bars from memory, or None if the symbol is not
+        streamed, fewer than `limit` bars are held or the ring is behind
+        the current interval while the feed is silent.
+        """
+        symbol = symbol.upper()
+        seconds = INTERVAL_SECONDS.get(interval)
+        if seconds is None:
+            return None
+
+        with self._lock:
+            if symbol not in self._tracked:
+                return None
+
+            ring = self._rings.get((symbol, interval))
+            if ring is None or ring.size == 0:
+                return None
+
+            now = int(time.time())
+            current = now - now % seconds
+            last = ring.last_time()
+            if current <= last:
+                return ring.to_list(limit) if ring.size >= limit else None
+
+            # Quiet market: show the empty intervals as flat bars, but only
+            # while trades are known to arrive (not during an outage)
+            if not self._feed_live(symbol):
+                return None
+            if ring.size + (current - last) // seconds < limit:
+                return None
+
+            close = ring.last_close()
+            flat = [
+                {"time": t, "open": close, "high": close, "low": close, "close": close, "volume": 0.0}
+                for t in range(max(last + seconds, current - (limit - 1) * seconds), current + seconds, seconds)
+            ]
+            return ring.to_list(limit - len(flat)) + flat
+
+    def closed_bars(self, symbol: str, interval: str, after: int) -> List[Dict]:
+        """
+        Verified closed bars opened after `after`, oldest first: the ring's
+        contiguous tail without the bar in progress and without a partial bar.
+        """
+        symbol = symbol.upper()
+        seconds = INTERVAL_SECONDS[interval]
+        key = (symbol, interval)
+        bars: List[Dict] = []
+
+        with self._lock:
+            ring = self._rings.get(key)
+            if ring is None:
+                return bars
+
+            partial = self._partial.get(key)
+            for i in range(ring.size - 2, -1, -1):
+                bar = ring.bar(i)
+                if bar["time"] <= after or bar["time"] == partial:
+                    break
+                if bars and bar["time"] != bars[-1]["time"] - seconds:
+                    # Hole (history seeded behind the live bars)
+                    break
+                bars.append(bar)
+
+        bars.reverse()
+        return bars
+
+    def seed(self, symbol: str, interval: str, candles: List[Dict]):
+        """
+        Load REST history into a tracked symbol's ring.
+        Live bars at or after the last REST bar are kept and merged in.
+        """
+        symbol = symbol.upper()
+        if not candles or interval not in INTERVAL_SECONDS:
+            return
+
+        with self._lock:
+            if symbol not in self._tracked:
+                return
+
+            key = (symbol, interval)
+            ring = self._ring(symbol, interval)
+            live = ring.to_list()
+            last_seeded = candles[-1]["time"]
+
+            # History now covers the start of the partial live bar
+            if self._partial.get(key, last_seeded + 1) <= last_seeded:
+                del self._partial[key]
+
+            ring.clear()
+            for c in candles[-ring.capacity:]:
+                ring.append(c["time"], c["open"], c["high"], c["low"], c["close"], c["volume"])
+
+            for bar in live:
+                if bar["time"] < last_seeded:
+                    continue
+                if bar["time"] == last_seeded:
+                    ring.merge_last(bar["high"], bar["low"], bar["close"], bar["volume"])
+                else:
+                    ring.append(bar["time"], bar["open"], bar["high"], bar["low"], bar["close"], bar["volume"])
+
+    def build_candles(self, trades: list, interval: str) -> List[Dict]:
+        """Build candlestick data from a batch of trades (price, quantity, timestamp in ms)"""
+        seconds = INTERVAL_SECONDS[interval]
+        candles: List[Dict] = []
+
+        for trade in trades:
+            ts = int(trade["timestamp"]) // 1000
+            bucket = ts - ts % seconds
+            price = trade["price"]
+            quantity = trade.get("quantity", 0.0)
+
+            if not candles or bucket > candles[-1]["time"]:
+                candles.append({
+                    "time": bucket,
+                    "open": price,
+                    "high": price,
+                    "low": price,
+                    "close": price,
+                    "volume": quantity
+                })
+            elif bucket == candles[-1]["time"]:
+                bar = candles[-1]
+                bar["high"] = max(bar["high"], price)
+                bar["low"] = min(bar["low"], price)
+                bar["close"] = price
+                bar["volume"] += quantity
+
+        return candles
+
+
+# -------------------------
+# Global singleton instance
+# -------------------------
+candle_builder = CandleBuilder()
@@ -0,0 +1,55 @@
+"""
+Compact candle encodings.
+
+- Packed binary (Redis cache entries): fixed header followed by the time
+  column as int64 and open/high/low/close/volume as float64, little endian.
+- Columnar (API responses): parallel arrays per field, as JSON or msgpack.
+"""
+import struct
+from typing import Dict, List, Tuple
+import msgpack
+import numpy as np
+
+CANDLE_FIELDS = ("time", "open", "high", "low", "close", "volume")
+
+# magic, fetched_at, soft_ttl, bar count
+_HEADER = struct.Struct("<2sdII")
+_MAGIC = b"C1"
+
+
+def pack_candles(candles: List[Dict], fetched_at: float, soft_ttl: int) -> bytes:
+    """Candles + cache metadata -> packed binary entry"""
+    count = len(candles)
+    parts = [_HEADER.pack(_MAGIC, fetched_at, soft_ttl, count)]
+    parts.append(np.fromiter((c["time"] for c in candles), dtype="<i8", count=count).tobytes())
+    for field in CANDLE_FIELDS[1:]:
+        parts.append(np.fromiter((c[field] for c in candles), dtype="<f8", count=count).tobytes())
+    return b"".join(parts)
+
+
+def unpack_candles(data: bytes) -> Tuple[List[Dict], float, int]:
+    """Packed binary entry -> (candles, fetched_at, soft_ttl); ValueError if unreadable"""
+    if len(data) < _HEADER.size:
+        raise ValueError("Truncated candle entry")
+
+    magic, fetched_at, soft_ttl, count = _HEADER.unpack_from(data)
+    if magic != _MAGIC or len(data) != _HEADER.size + count * 8 * len(CANDLE_FIELDS):
+        raise ValueError("Not a packed candle entry")
+
+    offset = _HEADER.size
+    columns = [np.frombuffer(data, dtype="<i8", count=count, offset=offset).tolist()]
+    for i in range(1, len(CANDLE_FIELDS)):
+        columns.append(np.frombuffer(data, dtype="<f8", count=count, offset=offset + i * count * 8).tolist())
+
+    candles = [dict(zip(CANDLE_FIELDS, row)) for row in zip(*columns)]
+    return candles, fetched_at, soft_ttl
+
+
+def to_columns(candles: List[Dict]) -> Dict[str, list]:
+    """Per-bar dicts -> {"time": [...], "open": [...], ...}"""
+    return {field: [c[field] for c in candles] for field in CANDLE_FIELDS}
+
+
+def to_msgpack(candles: List[Dict]) -> bytes:
+    """Columnar msgpack payload"""
+    return msgpack.packb(to_columns(candles), use_bin_type=True)
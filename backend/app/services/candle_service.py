@@ -0,0 +1,455 @@
+"""
+Candle retrieval for the chart endpoints.
+Candles are cached in fixed, interval-aligned chunks so every limit/range
+request is assembled from the same Redis entries.
+"""
+import asyncio
+import time
+import uuid
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+import redis
+import redis.asyncio as aioredis
+from ..config import settings
+from ..db import SessionLocal
+from ..utils.logger import logger
+from .binance_service import BinanceService, get_binance_service
+from .candle_builder import INTERVAL_SECONDS, candle_builder
+from .candle_codec import pack_candles, unpack_candles
+from .candle_store import CandleStore, kline_to_candle
+
+# Max bars Binance returns per /api/v3/klines request
+KLINES_PER_REQUEST = 1000
+
+# Deletes a lock only if it still holds our token
+RELEASE_LOCK_SCRIPT = """
+if redis.call("get", KEYS[1]) == ARGV[1] then
+    return redis.call("del", KEYS[1])
+end
+return 0
+"""
+
+
+def range_windows(interval: str, start_time: int, end_time: int, bars_per_window: int) -> List[tuple]:
+    """Split [start_time, end_time] into (start, end) windows of at most `bars_per_window` bar opens"""
+    seconds = INTERVAL_SECONDS[interval]
+    first = start_time + (-start_time % seconds)
+    span = bars_per_window * seconds
+
+    return [
+        (window_start, min(window_start + span - seconds, end_time))
+        for window_start in range(first, end_time + 1, span)
+    ]
+
+
+def current_open_time(interval: str) -> int:
+    """Open time of the bar in progress"""
+    seconds = INTERVAL_SECONDS[interval]
+    now = int(time.time())
+    return now - now % seconds
+
+
+async def fetch_candle_range(
+    binance: BinanceService,
+    symbol: str,
+    interval: str,
+    start_time: int,
+    end_time: int
+) -> List[Dict]:
+    """
+    Bars with start_time <= open time <= end_time (Unix seconds), oldest first.
+
+    Flow:
+    1. Split the range into windows of KLINES_PER_REQUEST bars.
+    2. Fetch every window concurrently with explicit startTime/endTime; the
+       REST client caps requests in flight (BINANCE_REST_MAX_CONCURRENCY).
+    3. Stitch the windows, drop duplicate open times and anything outside
+       the requested range.
+    """
+    windows = range_windows(interval, start_time, end_time, KLINES_PER_REQUEST)
+    if not windows:
+        return []
+
+    results = await asyncio.gather(*(
+        binance.aget_klines(
+            symbol=symbol,
+            interval=interval,
+            limit=KLINES_PER_REQUEST,
+            start_time=window_start * 1000,
+            end_time=window_end * 1000
+        )
+        for window_start, window_end in windows
+    ))
+
+    candles: Dict[int, Dict] = {}
+    for klines in results:
+        for kline in klines:
+            candle = kline_to_candle(kline)
+            if start_time <= candle["time"] <= end_time:
+                candles[candle["time"]] = candle
+
+    logger.info(f"📚 Fetched {len(candles)} {interval} candles for {symbol} in {len(windows)} windows")
+    return [candles[t] for t in sorted(candles)]
+
+
+def rollup_candles(base: List[Dict], interval: str, start_time: int, end_time: int) -> Dict[int, Dict]:
+    """
+    Aggregate 1m bars (sorted, unique) into `interval` bars opening in
+    [start_time, end_time]. Only bars whose every minute is present are
+    returned ({open_time: candle}); the bar in progress needs the minutes
+    up to now.
+    """
+    seconds = INTERVAL_SECONDS[interval]
+    base = [c for c in base if start_time <= c["time"] < end_time + seconds]
+    if not base:
+        return {}
+
+    count = len(base)
+    times = np.fromiter((bar["time"] for bar in base), dtype=np.int64, count=count)
+    opens = np.fromiter((bar["open"] for bar in base), dtype=np.float64, count=count)
+    highs = np.fromiter((bar["high"] for bar in base), dtype=np.float64, count=count)
+    lows = np.fromiter((bar["low"] for bar in base), dtype=np.float64, count=count)
+    closes = np.fromiter((bar["close"] for bar in base), dtype=np.float64, count=count)
+    volumes = np.fromiter((bar["volume"] for bar in base), dtype=np.float64, count=count)
+
+    # Contiguous runs of minutes that belong to the same target bar
+    buckets = times - times % seconds
+    starts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+    ends = np.r_[starts[1:], count] - 1
+    bar_times = buckets[starts]
+
+    # Minutes each bar needs: all of them, or those elapsed for the live bar
+    current_minute = current_open_time("1m")
+    expected = np.minimum(seconds // 60, (current_minute - bar_times) // 60 + 1)
+    complete = (ends - starts + 1) == expected
+
+    bar_highs = np.maximum.reduceat(highs, starts)
+    bar_lows = np.minimum.reduceat(lows, starts)
+    bar_volumes = np.add.reduceat(volumes, starts)
+
+    return {
+        int(bar_times[i]): {
+            "time": int(bar_times[i]),
+            "open": float(opens[starts[i]]),
+            "high": float(bar_highs[i]),
+            "low": float(bar_lows[i]),
+            "close": float(closes[ends[i]]),
+            "volume": float(bar_volumes[i])
+        }
+        for i in np.flatnonzero(complete)
+    }
+
+
+def _store_bars(symbol: str, interval: str, start_time: int, end_time: int) -> List[Dict]:
+    db = SessionLocal()
+    try:
+        return CandleStore.get_range(db, symbol, interval, start_time, end_time)
+    finally:
+        db.close()
+
+
+def _store_range(symbol: str, interval: str, start_time: int, end_time: int) -> Optional[List[Dict]]:
+    db = SessionLocal()
+    try:
+        return CandleStore.get_complete_range(db, symbol, interval, start_time, end_time)
+    finally:
+        db.close()
+
+
+def _store_upsert(symbol: str, interval: str, candles: List[Dict]) -> int:
+    db = SessionLocal()
+    try:
+        return CandleStore.upsert(db, symbol, interval, candles)
+    finally:
+        db.close()
+
+
+class CandleService:
+    """
+    Chunked candle cache in front of the candle store and the exchange.
+
+    Flow:
+    1. A request (latest `limit` bars or a time range) is mapped onto
+       interval-aligned chunks of CANDLE_CHUNK_BARS bars:
+       key candles:{symbol}:{interval}:{chunk_open_time}, value packed
+       binary (see candle_codec), so hits skip JSON parsing
+    2. Each chunk is read from Redis; on a miss it is loaded from the local
+       candle store if complete there, else from Binance (and stored).
+    3. Fully closed chunks never change and are cached for
+       CANDLE_CACHE_TTL_CLOSED; the chunk holding the bar in progress only
+       for CANDLE_CACHE_TTL_OPEN.
+    4. Misses are single-flight: concurrent callers in this process share
+       one fill task per chunk, and across workers a Redis lock lets one
+       fill while the others poll the cache for its result.
+    5. Stale-while-revalidate: past its soft TTL an entry is still served
+       immediately while one background task refreshes it; only past the
+       hard TTL (Redis expiry) does a caller wait for the exchange.
+    6. Higher intervals are rolled up from local 1m bars (store, cached 1m
+       chunks, live bar); only bars without complete 1m coverage are
+       fetched from the exchange.
+    """
+
+    def __init__(self, binance: BinanceService, redis_client: aioredis.Redis):
+        self.binance = binance
+        self.redis = redis_client
+
+        # {chunk key: fill task} - in-process single-flight
+        self._inflight: Dict[str, asyncio.Task] = {}
+
+        # {chunk key: background stale-while-revalidate refresh}
+        self._refreshing: Dict[str, asyncio.Task] = {}
+
+    @staticmethod
+    def chunk_span(interval: str) -> int:
+        return settings.CANDLE_CHUNK_BARS * INTERVAL_SECONDS[interval]
+
+    @staticmethod
+    def chunk_key(symbol: str, interval: str, chunk_start: int) -> str:
+        return f"candles:{symbol}:{interval}:{chunk_start}"
+
+    async def get_latest(self, symbol: str, interval: str, limit: int) -> List[Dict]:
+        """Newest `limit` bars including the bar in progress"""
+        current = current_open_time(interval)
+        start = current - (limit - 1) * INTERVAL_SECONDS[interval]
+        candles = await self.get_range(symbol, interval, start, current)
+        return candles[-limit:]
+
+    async def get_range(self, symbol: str, interval: str, start_time: int, end_time: int) -> List[Dict]:
+        """Bars with start_time <= open time <= end_time, assembled from cached chunks"""
+        symbol = symbol.upper()
+        span = self.chunk_span(interval)
+        end_time = min(end_time, current_open_time(interval))
+
+        first_chunk = start_time - start_time % span
+        chunk_starts = range(first_chunk, end_time + 1, span)
+
+        chunks = await asyncio.gather(*(
+            self._get_chunk(symbol, interval, chunk_start) for chunk_start in chunk_starts
+        ))
+
+        return [
+            candle
+            for chunk in chunks
+            for candle in chunk
+            if start_time <= candle["time"] <= end_time
+        ]
+
+    async def _get_chunk(self, symbol: str, interval: str, chunk_start: int) -> List[Dict]:
+        key = self.chunk_key(symbol, interval, chunk_start)
+
+        cached = await self._read_cache(key)
+        if cached is not None:
+            candles, stale = cached
+            if stale:
+                # Serve it now, refresh behind the caller's back
+                self._revalidate(symbol, interval, chunk_start, key)
+            return candles
+
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.create_task(self._fill_chunk(symbol, interval, chunk_start, key))
+            self._inflight[key] = task
+            task.add_done_callback(lambda done: self._forget_inflight(key, done))
+
+        # Shielded so one caller going away doesn't cancel the fill for the rest
+        return await asyncio.shield(task)
+
+    def _forget_inflight(self, key: str, task: asyncio.Task):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+
+    async def _read_cache(self, key: str) -> Optional[Tuple[List[Dict], bool]]:
+        """(candles, stale) or None; stale once older than the entry's soft TTL"""
+        try:
+            cached = await self.redis.get(key)
+            if cached:
+                candles, fetched_at, soft_ttl = unpack_candles(cached)
+                return candles, time.time() - fetched_at > soft_ttl
+        except redis.RedisError as e:
+            logger.warning(f"Redis error (continuing without cache): {e}")
+        except ValueError:
+            pass  # Unreadable entry, treat as a miss and overwrite it
+        return None
+
+    async def _write_cache(self, key: str, interval: str, chunk_start: int, candles: List[Dict]):
+        # Closed chunks are immutable; the open one changes with every bar.
+        # Redis expiry is the hard TTL; the soft TTL travels with the entry.
+        chunk_end = chunk_start + self.chunk_span(interval)
+        if chunk_end <= current_open_time(interval):
+            soft_ttl = hard_ttl = settings.CANDLE_CACHE_TTL_CLOSED
+        else:
+            soft_ttl = settings.CANDLE_CACHE_TTL_OPEN
+            hard_ttl = settings.CANDLE_CACHE_HARD_TTL_OPEN
+
+        try:
+            await self.redis.setex(key, hard_ttl, pack_candles(candles, time.time(), soft_ttl))
+        except redis.RedisError as e:
+            logger.warning(f"Failed to cache data (continuing): {e}")
+
+    async def _acquire(self, lock_key: str) -> Tuple[bool, Optional[str]]:
+        """
+        (proceed, token): token is set if we hold the lock; proceed is also
+        True when Redis is unavailable and we load without it.
+        """
+        token = uuid.uuid4().hex
+        try:
+            if await self.redis.set(lock_key, token, nx=True, px=settings.CANDLE_LOCK_TTL_MS):
+                return True, token
+            return False, None
+        except redis.RedisError as e:
+            logger.warning(f"Redis lock unavailable for {lock_key} (loading without it): {e}")
+            return True, None
+
+    async def _release(self, lock_key: str, token: Optional[str]):
+        if token is None:
+            return
+        try:
+            await self.redis.eval(RELEASE_LOCK_SCRIPT, 1, lock_key, token)
+        except redis.RedisError as e:
+            logger.warning(f"Failed to release {lock_key} (expires on its own): {e}")
+
+    async def _fill_chunk(self, symbol: str, interval: str, chunk_start: int, key: str) -> List[Dict]:
+        """
+        Load and cache one chunk, at most once across all workers.
+        Whoever holds lock:{key} loads it; everyone else waits for the cache.
+        """
+        lock_key = f"lock:{key}"
+        proceed, token = await self._acquire(lock_key)
+
+        if not proceed:
+            candles = await self._wait_for_fill(key, lock_key)
+            if candles is not None:
+                return candles
+            # Holder died or timed out: load it ourselves
+
+        try:
+            # Another worker may have filled it between our miss and the lock
+            cached = await self._read_cache(key)
+            if cached is not None:
+                return cached[0]
+
+            candles = await self._load_chunk(symbol, interval, chunk_start)
+            await self._write_cache(key, interval, chunk_start, candles)
+            return candles
+        finally:
+            await self._release(lock_key, token)
+
+    async def _wait_for_fill(self, key: str, lock_key: str) -> Optional[List[Dict]]:
+        """Poll the cache while another worker holds the lock"""
+        deadline = time.monotonic() + settings.CANDLE_LOCK_TTL_MS / 1000
+
+        while time.monotonic() < deadline:
+            await asyncio.sleep(settings.CANDLE_LOCK_POLL_SECONDS)
+
+            cached = await self._read_cache(key)
+            if cached is not None:
+                return cached[0]
+
+            try:
+                if not await self.redis.exists(lock_key):
+                    cached = await self._read_cache(key)
+                    return cached[0] if cached is not None else None
+            except redis.RedisError:
+                return None
+
+        return None
+
+    def _revalidate(self, symbol: str, interval: str, chunk_start: int, key: str):
+        """Start a background refresh of a stale chunk (once per chunk)"""
+        if key in self._inflight or key in self._refreshing:
+            return
+        task = asyncio.create_task(self._refresh_chunk(symbol, interval, chunk_start, key))
+        self._refreshing[key] = task
+        task.add_done_callback(lambda _: self._refreshing.pop(key, None))
+
+    async def _refresh_chunk(self, symbol: str, interval: str, chunk_start: int, key: str):
+        lock_key = f"lock:{key}"
+        proceed, token = await self._acquire(lock_key)
+        if not proceed:
+            return  # Another worker is already refreshing it
+
+        try:
+            candles = await self._load_chunk(symbol, interval, chunk_start)
+            await self._write_cache(key, interval, chunk_start, candles)
+        except Exception as e:
+            logger.warning(f"Background refresh of {key} failed (serving stale): {e}")
+        finally:
+            await self._release(lock_key, token)
+
+    async def _base_bars(self, symbol: str, start_time: int, end_time: int) -> List[Dict]:
+        """
+        Local 1m bars for [start_time, end_time]: candle store, then cached
+        1m chunks (read only, never filled from the exchange), then the live
+        bar from the candle builder.
+        """
+        bars: Dict[int, Dict] = {}
+
+        try:
+            for candle in await asyncio.to_thread(_store_bars, symbol, "1m", start_time, end_time):
+                bars[candle["time"]] = candle
+        except Exception as e:
+            logger.warning(f"Candle store error (continuing without store): {e}")
+
+        expected = (end_time - start_time) // 60 + 1
+        if len(bars) < expected:
+            span = self.chunk_span("1m")
+            chunk_starts = range(start_time - start_time % span, end_time + 1, span)
+            if len(chunk_starts) <= settings.CANDLE_ROLLUP_MAX_BASE_CHUNKS:
+                for cached in await asyncio.gather(*(
+                    self._read_cache(self.chunk_key(symbol, "1m", chunk_start)) for chunk_start in chunk_starts
+                )):
+                    if cached is not None:
+                        for candle in cached[0]:
+                            bars.setdefault(candle["time"], candle)
+
+        live = candle_builder.get_candles(symbol, "1m", 1)
+        if live:
+            bars[live[-1]["time"]] = live[-1]
+
+        return [bars[t] for t in sorted(bars) if start_time <= t <= end_time]
+
+    async def _load_chunk(self, symbol: str, interval: str, chunk_start: int) -> List[Dict]:
+        """
+        One chunk from the candle store if complete there, else rolled up
+        from local 1m bars where possible and the rest from Binance
+        """
+        seconds = INTERVAL_SECONDS[interval]
+        chunk_end = min(chunk_start + self.chunk_span(interval) - seconds, current_open_time(interval))
+
+        try:
+            candles = await asyncio.to_thread(_store_range, symbol, interval, chunk_start, chunk_end)
+            if candles is not None:
+                return candles
+        except Exception as e:
+            logger.warning(f"Candle store error (continuing without store): {e}")
+
+        bars: Dict[int, Dict] = {}
+        if interval != "1m":
+            base_end = min(chunk_end + seconds - 60, current_open_time("1m"))
+            base = await self._base_bars(symbol, chunk_start, base_end)
+            bars = rollup_candles(base, interval, chunk_start, chunk_end)
+
+        missing = [t for t in range(chunk_start, chunk_end + 1, seconds) if t not in bars]
+        if bars:
+            logger.info(f"🧮 Rolled up {len(bars)} {interval} candles for {symbol} from 1m bars")
+
+        if missing:
+            logger.info(f"❌ Cache MISS - Fetching {len(missing)} {interval} candles for {symbol} from Binance")
+            fetched = await fetch_candle_range(self.binance, symbol, interval, missing[0], missing[-1])
+            for candle in fetched:
+                bars.setdefault(candle["time"], candle)
+
+        candles = [bars[t] for t in sorted(bars)]
+
+        try:
+            await asyncio.to_thread(_store_upsert, symbol, interval, candles)
+        except Exception as e:
+            logger.warning(f"Failed to store candles (continuing): {e}")
+
+        return candles
+
+
+# -------------------------
+# Global singleton instance
+# -------------------------
+candle_service = CandleService(get_binance_service(), aioredis.from_url(settings.REDIS_URL))
@@ -0,0 +1,217 @@
+import asyncio
+import time
+from collections import deque
+from typing import Deque, Dict, List, Optional, Tuple
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+from ..config import settings
+from ..db import SessionLocal
+from ..models.candle import Candle
+from ..utils.logger import logger
+from .candle_builder import INTERVAL_SECONDS, candle_builder
+
+
+class CandleStore:
+    """
+    Persistent OHLCV store keyed by (symbol, interval, open_time).
+    
+    Only closed bars are stored; the bar in progress lives in the
+    candle builder (or comes from the exchange).
+    """
+    
+    @staticmethod
+    def get_range(db: Session, symbol: str, interval: str, start_time: int, end_time: int) -> List[Dict]:
+        """Bars with start_time <= open_time <= end_time, oldest first (one index range scan)"""
+        rows = db.query(
+            Candle.open_time, Candle.open, Candle.high, Candle.low, Candle.close, Candle.volume
+        ).filter(
+            Candle.symbol == symbol.upper(),
+            Candle.interval == interval,
+            Candle.open_time >= start_time,
+            Candle.open_time <= end_time
+        ).order_by(Candle.open_time).all()
+        
+        return [
+            {
+                "time": row.open_time,
+                "open": row.open,
+                "high": row.high,
+                "low": row.low,
+                "close": row.close,
+                "volume": row.volume
+            }
+            for row in rows
+        ]
+    
+    @staticmethod
+    def upsert(db: Session, symbol: str, interval: str, candles: List[Dict]) -> int:
+        """Insert or overwrite bars; bars that have not closed yet are skipped"""
+        seconds = INTERVAL_SECONDS[interval]
+        now = int(time.time())
+        symbol = symbol.upper()
+        
+        values = [
+            {
+                "symbol": symbol,
+                "interval": interval,
+                "open_time": c["time"],
+                "open": c["open"],
+                "high": c["high"],
+                "low": c["low"],
+                "close": c["close"],
+                "volume": c["volume"]
+            }
+            for c in candles
+            if c["time"] + seconds <= now
+        ]
+        if not values:
+            return 0
+        
+        stmt = insert(Candle).values(values)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[Candle.symbol, Candle.interval, Candle.open_time],
+            set_={
+                "open": stmt.excluded.open,
+                "high": stmt.excluded.high,
+                "low": stmt.excluded.low,
+                "close": stmt.excluded.close,
+                "volume": stmt.excluded.volume
+            }
+        )
+        db.execute(stmt)
+        db.commit()
+        return len(values)
+    
+    @staticmethod
+    def expected_bars(interval: str, start_time: int, end_time: int) -> Tuple[int, int, int]:
+        """
+        (first_open, last_closed_open, count) of the closed bars a complete
+        store holds for [start_time, end_time].
+        """
+        seconds = INTERVAL_SECONDS[interval]
+        now = int(time.time())
+        
+        first = start_time + (-start_time % seconds)
+        last = min(end_time - end_time % seconds, now - now % seconds - seconds)
+        if last < first:
+            return first, last, 0
+        return first, last, (last - first) // seconds + 1
+    
+    @staticmethod
+    def get_complete_range(
+        db: Session, symbol: str, interval: str, start_time: int, end_time: int
+    ) -> Optional[List[Dict]]:
+        """
+        Bars for the range if the store (plus the live bar in progress from
+        the candle builder) covers it completely, else None.
+        """
+        first, last, expected = CandleStore.expected_bars(interval, start_time, end_time)
+        candles = CandleStore.get_range(db, symbol, interval, first, last) if expected else []
+        if len(candles) != expected:
+            return None
+        
+        # Range reaches into the bar in progress
+        seconds = INTERVAL_SECONDS[interval]
+        now = int(time.time())
+        current = now - now % seconds
+        if end_time >= current:
+            live = candle_builder.get_candles(symbol, interval, 1)
+            if not live or live[-1]["time"] != current:
+                return None
+            candles.append(live[-1])
+        
+        return candles
+    
+    @staticmethod
+    def backfill(db: Session, binance, symbol: str, interval: str, start_time: int, end_time: int) -> int:
+        """Page closed bars for [start_time, end_time] from the exchange into the store"""
+        seconds = INTERVAL_SECONDS[interval]
+        stored = 0
+        cursor = start_time
+        
+        while cursor <= end_time:
+            klines = binance.get_klines(
+                symbol=symbol.upper(),
+                interval=interval,
+                limit=1000,
+                start_time=cursor * 1000,
+                end_time=end_time * 1000
+            )
+            if not klines:
+                break
+            
+            stored += CandleStore.upsert(db, symbol, interval, [kline_to_candle(k) for k in klines])
+            cursor = int(klines[-1][0]) // 1000 + seconds
+        
+        return stored
+
+
+def kline_to_candle(kline: list) -> Dict:
+    """Binance kline row -> lightweight-charts candle"""
+    return {
+        "time": int(kline[0]) // 1000,  # Convert milliseconds to seconds
+        "open": float(kline[1]),
+        "high": float(kline[2]),
+        "low": float(kline[3]),
+        "close": float(kline[4]),
+        "volume": float(kline[5])
+    }
+
+
+def _persist(batches: Dict[Tuple[str, str], List[Dict]]) -> int:
+    db = SessionLocal()
+    try:
+        return sum(
+            CandleStore.upsert(db, symbol, interval, candles)
+            for (symbol, interval), candles in batches.items()
+        )
+    finally:
+        db.close()
+
+
+class CandleWriter:
+    """
+    Write-behind buffer between the candle builder and the store.
+    
+    Flow:
+    1. on_bar_close() is registered as a candle builder close listener and
+       only appends to an in-memory buffer (runs on the tick path). Partial
+       bars and bars across an unreplayed feed gap are never reported, so
+       everything buffered is safe to treat as authoritative.
+    2. run() flushes the buffer every CANDLE_FLUSH_INTERVAL_SECONDS with one
+       batched upsert per (symbol, interval), off the event loop.
+    """
+    
+    def __init__(self):
+        self._buffer: Deque[Tuple[str, str, Dict]] = deque()
+    
+    def on_bar_close(self, symbol: str, interval: str, bar: Dict):
+        self._buffer.append((symbol, interval, bar))
+    
+    def _drain(self) -> Dict[Tuple[str, str], List[Dict]]:
+        batches: Dict[Tuple[str, str], List[Dict]] = {}
+        while self._buffer:
+            symbol, interval, bar = self._buffer.popleft()
+            batches.setdefault((symbol, interval), []).append(bar)
+        return batches
+    
+    async def run(self):
+        while True:
+            await asyncio.sleep(settings.CANDLE_FLUSH_INTERVAL_SECONDS)
+            
+            batches = self._drain()
+            if not batches:
+                continue
+            
+            try:
+                stored = await asyncio.to_thread(_persist, batches)
+                logger.info(f"🕯️ Persisted {stored} closed candles")
+            except Exception as e:
+                logger.error(f"Candle persistence failed: {e}", exc_info=True)
+
+
+# -------------------------
+# Global singleton instance
+# -------------------------
+candle_writer = CandleWriter()
+candle_builder.add_close_listener(candle_writer.on_bar_close)
@@ -1,9 +1,12 @@
+from sqlalchemy import case, update
 from sqlalchemy.orm import Session
+from collections import defaultdict
 from datetime import datetime
 from ..models.demo_wallet import DemoWallet
 from ..models.demo_order import DemoOrder
 from ..schemas.demo_order import DemoOrderCreate, DemoOrderResponse
 from ..schemas.demo_wallet import DemoWalletResponse
+from .order_trigger_index import order_trigger_index
 from ..utils.logger import logger
 
 class DemoTradingEngine:
@@ -116,6 +119,8 @@ class DemoTradingEngine:
         db.commit()
         db.refresh(order)
         
+        order_trigger_index.add(order)
+        
         logger.info(
             f"📈 User {user_id} placed {side} order: {size} {symbol} @ ${entry_price}. "
             f"SL: ${stop_loss}, TP: ${take_profit}. Wallet balance: ${wallet.balance}"
@@ -124,73 +129,197 @@ class DemoTradingEngine:
         return order
 
     @staticmethod
-    def check_and_close_orders(db: Session, symbol: str, current_price: float) -> list:
+    def check_and_close_orders(
+        db: Session,
+        symbol: str,
+        current_price: float,
+        low: float = None,
+        high: float = None,
+    ) -> list:
         """
-        Check all open orders for the given symbol.
-        Close any that hit stop-loss or take-profit.
+        Close open orders for the given symbol whose stop-loss or
+        take-profit was crossed.
         
         Args:
             symbol: Trading pair (e.g., "BTCUSDT")
             current_price: Current market price
+            low/high: Price range traded since the last check (defaults to current_price)
         
         Returns:
-            List of closed orders
+            List of closed order rows (id, user_id, symbol, side, size,
+            entry_price, close_price, pnl, status)
+        
+        Flow:
+        1. The in-memory trigger index picks the crossed orders; ticks that
+           trigger nothing cost no DB round-trip.
+        2. One set-based UPDATE ... RETURNING closes all of them (guarded by
+           status = 'OPEN' so an order is never closed twice).
+        3. One UPDATE credits each affected wallet with its aggregated proceeds.
+        4. A single commit for the whole batch.
+        
+        An order fills at current_price if that price is still past its
+        trigger, otherwise at the trigger level crossed inside [low, high].
         """
-        closed_orders = []
-        open_orders = db.query(DemoOrder).filter(
-            DemoOrder.symbol == symbol,
-            DemoOrder.status == "OPEN"
-        ).all()
-        
-        for order in open_orders:
-            # Update current price and calculate P/L
-            order.current_price = current_price
-            order.pnl = DemoTradingEngine.calculate_pnl(order, current_price)
-            
-            should_close = False
-            close_reason = None
-            
-            if order.side == "BUY":
-                # BUY: profit when price goes up, loss when price goes down
-                if order.take_profit and current_price >= order.take_profit:
-                    should_close = True
-                    close_reason = "TP_HIT"
-                elif order.stop_loss and current_price <= order.stop_loss:
-                    should_close = True
-                    close_reason = "SL_HIT"
+        low = current_price if low is None else low
+        high = current_price if high is None else high
+        
+        hits = order_trigger_index.triggered(symbol, low, high)
+        if not hits:
+            return []
+        
+        statuses = {}
+        fill_prices = {}
+        for order_id, close_reason in hits.items():
+            entry = order_trigger_index.get(order_id)
+            if entry is None:
+                continue
+            statuses[order_id] = close_reason
+            fill_prices[order_id] = DemoTradingEngine._trigger_fill_price(entry, close_reason, current_price)
+        
+        if not statuses:
+            return []
+        
+        now = datetime.utcnow()
+        fill_price = case(fill_prices, value=DemoOrder.id)
+        
+        close_stmt = (
+            update(DemoOrder)
+            .where(DemoOrder.id.in_(list(statuses)), DemoOrder.status == "OPEN")
+            .values(
+                status=case(statuses, value=DemoOrder.id),
+                close_price=fill_price,
+                current_price=fill_price,
+                pnl=case(
+                    (DemoOrder.side == "BUY", (fill_price - DemoOrder.entry_price) * DemoOrder.size),
+                    (DemoOrder.side == "SELL", (DemoOrder.entry_price - fill_price) * DemoOrder.size),
+                    else_=0.0,
+                ),
+                closed_at=now,
+            )
+            .returning(
+                DemoOrder.id,
+                DemoOrder.user_id,
+                DemoOrder.symbol,
+                DemoOrder.side,
+                DemoOrder.size,
+                DemoOrder.entry_price,
+                DemoOrder.close_price,
+                DemoOrder.pnl,
+                DemoOrder.status,
+            )
+            .execution_options(synchronize_session=False)
+        )
+        
+        try:
+            closed_orders = db.execute(close_stmt).all()
             
-            elif order.side == "SELL":
-                # SELL: profit when price goes down, loss when price goes up
-                if order.take_profit and current_price <= order.take_profit:
-                    should_close = True
-                    close_reason = "TP_HIT"
-                elif order.stop_loss and current_price >= order.stop_loss:
-                    should_close = True
-                    close_reason = "SL_HIT"
+            # Add back the proceeds, aggregated per user
+            credits = defaultdict(float)
+            for order in closed_orders:
+                credits[order.user_id] += (order.size * order.close_price) + order.pnl
             
-            if should_close:
-                order.status = close_reason
-                order.close_price = current_price
-                order.closed_at = datetime.utcnow()
-                
-                # Update wallet: add back the proceeds
-                wallet = DemoTradingEngine.get_or_create_wallet(db, order.user_id)
-                proceeds = (order.size * current_price) + order.pnl
-                wallet.balance += proceeds
-                wallet.updated_at = datetime.utcnow()
-                
-                db.commit()
-                db.refresh(order)
-                db.refresh(wallet)
-                
-                closed_orders.append(order)
-                logger.info(
-                    f"🔴 Order {order.id} closed ({close_reason}). "
-                    f"P/L: ${order.pnl}. User wallet: ${wallet.balance}"
+            if credits:
+                db.execute(
+                    update(DemoWallet)
+                    .where(DemoWallet.user_id.in_(list(credits)))
+                    .values(
+                        balance=DemoWallet.balance + case(dict(credits), value=DemoWallet.user_id),
+                        updated_at=now,
+                    )
+                    .execution_options(synchronize_session=False)
                 )
+            
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        
+        # Orders missing from RETURNING were already closed elsewhere
+        for order_id in statuses:
+            order_trigger_index.remove(order_id)
+        
+        if closed_orders:
+            logger.info(
+                f"🔴 Closed {len(closed_orders)} {symbol} orders on SL/TP "
+                f"across {len(credits)} wallets"
+            )
         
         return closed_orders
 
+    @staticmethod
+    def get_wallets(db: Session, user_ids) -> dict:
+        """
+        Fetch the demo wallets of several users in one query.
+        Returns {user_id: DemoWallet}.
+        """
+        user_ids = list(user_ids)
+        if not user_ids:
+            return {}
+        
+        wallets = db.query(DemoWallet).filter(DemoWallet.user_id.in_(user_ids)).all()
+        return {wallet.user_id: wallet for wallet in wallets}
+
+    @staticmethod
+    def _trigger_fill_price(order: dict, close_reason: str, current_price: float) -> float:
+        """
+        Price an SL/TP close fills at: the current price if it is still past
+        the trigger, otherwise the trigger level itself.
+        """
+        trigger = order["take_profit"] if close_reason == "TP_HIT" else order["stop_loss"]
+        
+        # Directions in which the price has crossed each trigger
+        crossed_upwards = (order["side"] == "BUY") == (close_reason == "TP_HIT")
+        if crossed_upwards:
+            return current_price if current_price >= trigger else trigger
+        return current_price if current_price <= trigger else trigger
+
+    @staticmethod
+    def with_unrealized_pnl(order: DemoOrder, current_price: float = None) -> DemoOrderResponse:
+        """
+        Response for an order with PnL marked to current_price.
+        Computed on read only - nothing is written to the DB.
+        """
+        response = DemoOrderResponse.model_validate(order)
+        if order.status != "OPEN" or current_price is None:
+            return response
+        
+        return response.model_copy(update={
+            "current_price": current_price,
+            "pnl": DemoTradingEngine.calculate_pnl(order, current_price),
+        })
+
+    @staticmethod
+    def snapshot_open_orders(db: Session, prices: dict) -> int:
+        """
+        Persist current_price/pnl of every OPEN order on the given symbols
+        with one set-based UPDATE and one commit.
+        
+        Args:
+            prices: {symbol: current price}
+        
+        Returns:
+            Number of orders updated
+        """
+        if not prices:
+            return 0
+        
+        price = case(prices, value=DemoOrder.symbol)
+        result = db.execute(
+            update(DemoOrder)
+            .where(DemoOrder.status == "OPEN", DemoOrder.symbol.in_(list(prices)))
+            .values(
+                current_price=price,
+                pnl=case(
+                    (DemoOrder.side == "BUY", (price - DemoOrder.entry_price) * DemoOrder.size),
+                    (DemoOrder.side == "SELL", (DemoOrder.entry_price - price) * DemoOrder.size),
+                    else_=0.0,
+                ),
+            )
+            .execution_options(synchronize_session=False)
+        )
+        db.commit()
+        return result.rowcount
+
     @staticmethod
     def calculate_pnl(order: DemoOrder, current_price: float) -> float:
         """
@@ -256,6 +385,8 @@ class DemoTradingEngine:
         db.refresh(order)
         db.refresh(wallet)
         
+        order_trigger_index.remove(order.id)
+        
         logger.info(f"🔴 Order {order.id} manually closed. Exit price: ${close_price}, PnL: ${pnl}")
         
         return order
\ No newline at end of file
@@ -0,0 +1,579 @@
+"""
+Server-side technical indicators.
+
+- Batch kernels are NumPy-vectorized over a candle series (REST, seeding).
+- Streaming states update in O(1) per closed bar and follow the same
+  seeding rules as the kernels (EMA/RSI start from the SMA of the first
+  `period` values), so streamed values continue the batch series.
+"""
+import asyncio
+from collections import OrderedDict, deque
+from typing import Callable, Dict, List, Optional, Tuple
+import numpy as np
+from ..config import settings
+from ..utils.logger import logger
+from .candle_builder import INTERVAL_SECONDS, candle_builder
+from .candle_service import candle_service, current_open_time, fetch_candle_range
+
+INDICATOR_DEFAULTS = {
+    "sma": {"period": 20},
+    "ema": {"period": 20},
+    "rsi": {"period": 14},
+    "macd": {"fast": 12, "slow": 26, "signal": 9},
+    "bollinger": {"period": 20, "stddev": 2.0},
+    "vwap": {},
+}
+
+# (symbol, interval, indicator, normalized params)
+StreamKey = Tuple[str, str, str, Tuple[Tuple[str, float], ...]]
+
+# Block length for the vectorized EMA recurrence (keeps decay powers in range)
+_EMA_BLOCK = 64
+
+
+def normalize_params(indicator: str, params: Optional[dict]) -> Tuple[Tuple[str, float], ...]:
+    """Defaults + overrides as a hashable, sorted tuple; ValueError if invalid"""
+    if indicator not in INDICATOR_DEFAULTS:
+        raise ValueError(f"Unknown indicator: {indicator}")
+
+    merged = dict(INDICATOR_DEFAULTS[indicator])
+    for name, value in (params or {}).items():
+        if value is None:
+            continue
+        if name not in merged:
+            raise ValueError(f"Unknown parameter for {indicator}: {name}")
+        merged[name] = float(value) if name == "stddev" else int(value)
+
+    for name, value in merged.items():
+        if value <= 0 or (name != "stddev" and value > settings.INDICATOR_MAX_PERIOD):
+            raise ValueError(f"Invalid {name} for {indicator}: {value}")
+    if indicator == "macd" and merged["fast"] >= merged["slow"]:
+        raise ValueError("MACD fast period must be shorter than slow period")
+
+    return tuple(sorted(merged.items()))
+
+
+def history_bars(indicator: str, params: dict, interval: str) -> int:
+    """
+    Bars every computation runs over, independent of the requested limit,
+    so REST series and stream seeds agree and share one cached result.
+    """
+    return settings.INDICATOR_HISTORY_BARS + warmup_bars(indicator, params, interval)
+
+
+def warmup_bars(indicator: str, params: dict, interval: str) -> int:
+    """Extra history so recursive indicators have converged by the first returned bar"""
+    if indicator == "vwap":
+        # Session VWAP resets at 00:00 UTC
+        return 86400 // INTERVAL_SECONDS[interval]
+    if indicator == "macd":
+        return 3 * params["slow"] + params["signal"]
+    if indicator in ("ema", "rsi"):
+        return 3 * params["period"]
+    return params["period"] - 1
+
+
+# -------------------------
+# Vectorized kernels
+# -------------------------
+def _ema_recursive(x: np.ndarray, alpha: float, seed: float) -> np.ndarray:
+    """y[i] = y[i-1] + alpha * (x[i] - y[i-1]) with y[-1] = seed, evaluated blockwise"""
+    beta = 1.0 - alpha
+    if beta == 0.0:
+        return x.astype(np.float64, copy=True)
+
+    out = np.empty(len(x), dtype=np.float64)
+    prev = seed
+    for start in range(0, len(x), _EMA_BLOCK):
+        block = x[start:start + _EMA_BLOCK]
+        decay = beta ** np.arange(1, len(block) + 1)
+        out[start:start + len(block)] = decay * (prev + alpha * np.cumsum(block / decay))
+        prev = out[start + len(block) - 1]
+    return out
+
+
+def sma(close: np.ndarray, period: int) -> np.ndarray:
+    out = np.full(len(close), np.nan)
+    if len(close) >= period:
+        csum = np.cumsum(np.r_[0.0, close])
+        out[period - 1:] = (csum[period:] - csum[:-period]) / period
+    return out
+
+
+def ema(close: np.ndarray, period: int) -> np.ndarray:
+    out = np.full(len(close), np.nan)
+    if len(close) >= period:
+        seed = close[:period].mean()
+        out[period - 1] = seed
+        out[period:] = _ema_recursive(close[period:], 2.0 / (period + 1), seed)
+    return out
+
+
+def rsi(close: np.ndarray, period: int) -> np.ndarray:
+    """Wilder's RSI"""
+    out = np.full(len(close), np.nan)
+    diff = np.diff(close)
+    if len(diff) < period:
+        return out
+
+    gains = np.clip(diff, 0.0, None)
+    losses = np.clip(-diff, 0.0, None)
+    alpha = 1.0 / period
+
+    avg_gain = np.r_[gains[:period].mean(), _ema_recursive(gains[period:], alpha, gains[:period].mean())]
+    avg_loss = np.r_[losses[:period].mean(), _ema_recursive(losses[period:], alpha, losses[:period].mean())]
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        values = 100.0 - 100.0 / (1.0 + avg_gain / avg_loss)
+    out[period:] = np.where(avg_loss == 0.0, 100.0, values)
+    return out
+
+
+def macd(close: np.ndarray, fast: int, slow: int, signal: int) -> Dict[str, np.ndarray]:
+    line = ema(close, fast) - ema(close, slow)
+    signal_line = np.full(len(close), np.nan)
+    if len(close) >= slow:
+        signal_line[slow - 1:] = ema(line[slow - 1:], signal)
+    return {"macd": line, "signal": signal_line, "histogram": line - signal_line}
+
+
+def bollinger(close: np.ndarray, period: int, stddev: float) -> Dict[str, np.ndarray]:
+    middle = sma(close, period)
+    upper = np.full(len(close), np.nan)
+    lower = np.full(len(close), np.nan)
+    if len(close) >= period:
+        deviation = np.lib.stride_tricks.sliding_window_view(close, period).std(axis=1)
+        upper[period - 1:] = middle[period - 1:] + stddev * deviation
+        lower[period - 1:] = middle[period - 1:] - stddev * deviation
+    return {"middle": middle, "upper": upper, "lower": lower}
+
+
+def vwap(time: np.ndarray, high: np.ndarray, low: np.ndarray, close: np.ndarray, volume: np.ndarray) -> np.ndarray:
+    """Session VWAP, reset at 00:00 UTC"""
+    if len(time) == 0:
+        return np.array([], dtype=np.float64)
+
+    day = time // 86400
+    session_start = np.r_[True, day[1:] != day[:-1]]
+    session = np.cumsum(session_start) - 1
+
+    cum_pv = np.cumsum((high + low + close) / 3.0 * volume)
+    cum_volume = np.cumsum(volume)
+
+    # Cumulative totals before each session starts
+    starts = np.flatnonzero(session_start)
+    base_pv = np.r_[0.0, cum_pv][starts][session]
+    base_volume = np.r_[0.0, cum_volume][starts][session]
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return (cum_pv - base_pv) / (cum_volume - base_volume)
+
+
+def compute_indicator(indicator: str, candles: List[Dict], params: dict) -> Dict[str, np.ndarray]:
+    """Full series for `candles` as {output name: values} (NaN until warmed up)"""
+    count = len(candles)
+    close = np.fromiter((c["close"] for c in candles), dtype=np.float64, count=count)
+
+    if indicator == "sma":
+        return {"sma": sma(close, params["period"])}
+    if indicator == "ema":
+        return {"ema": ema(close, params["period"])}
+    if indicator == "rsi":
+        return {"rsi": rsi(close, params["period"])}
+    if indicator == "macd":
+        return macd(close, params["fast"], params["slow"], params["signal"])
+    if indicator == "bollinger":
+        return bollinger(close, params["period"], params["stddev"])
+
+    time = np.fromiter((c["time"] for c in candles), dtype=np.int64, count=count)
+    high = np.fromiter((c["high"] for c in candles), dtype=np.float64, count=count)
+    low = np.fromiter((c["low"] for c in candles), dtype=np.float64, count=count)
+    volume = np.fromiter((c["volume"] for c in candles), dtype=np.float64, count=count)
+    return {"vwap": vwap(time, high, low, close, volume)}
+
+
+# -------------------------
+# Streaming states (O(1) per bar)
+# -------------------------
+class _EMAState:
+    def __init__(self, period: int, alpha: Optional[float] = None):
+        self.period = period
+        self.alpha = alpha if alpha is not None else 2.0 / (period + 1)
+        self.count = 0
+        self.total = 0.0
+        self.value: Optional[float] = None
+
+    def update(self, x: float) -> Optional[float]:
+        if self.value is None:
+            self.count += 1
+            self.total += x
+            if self.count == self.period:
+                self.value = self.total / self.period
+            return self.value
+
+        self.value += self.alpha * (x - self.value)
+        return self.value
+
+
+class _WindowState:
+    """Rolling sum and sum of squares over the last `period` values"""
+
+    def __init__(self, period: int):
+        self.period = period
+        self.window: deque = deque()
+        self.total = 0.0
+        self.total_sq = 0.0
+
+    def update(self, x: float) -> bool:
+        self.window.append(x)
+        self.total += x
+        self.total_sq += x * x
+        if len(self.window) > self.period:
+            old = self.window.popleft()
+            self.total -= old
+            self.total_sq -= old * old
+        return len(self.window) == self.period
+
+
+class SMAState:
+    def __init__(self, period: int):
+        self.window = _WindowState(period)
+
+    def update(self, bar: Dict) -> Dict[str, Optional[float]]:
+        full = self.window.update(bar["close"])
+        return {"sma": self.window.total / self.window.period if full else None}
+
+
+class EMAState:
+    def __init__(self, period: int):
+        self.ema = _EMAState(period)
+
+    def update(self, bar: Dict) -> Dict[str, Optional[float]]:
+        return {"ema": self.ema.update(bar["close"])}
+
+
+class RSIState:
+    def __init__(self, period: int):
+        self.prev_close: Optional[float] = None
+        self.avg_gain = _EMAState(period, alpha=1.0 / period)
+        self.avg_loss = _EMAState(period, alpha=1.0 / period)
+
+    def update(self, bar: Dict) -> Dict[str, Optional[float]]:
+        close = bar["close"]
+        if self.prev_close is None:
+            self.prev_close = close
+            return {"rsi": None}
+
+        diff = close - self.prev_close
+        self.prev_close = close
+        gain = self.avg_gain.update(max(diff, 0.0))
+        loss = self.avg_loss.update(max(-diff, 0.0))
+
+        if gain is None:
+            return {"rsi": None}
+        if loss == 0.0:
+            return {"rsi": 100.0}
+        return {"rsi": 100.0 - 100.0 / (1.0 + gain / loss)}
+
+
+class MACDState:
+    def __init__(self, fast: int, slow: int, signal: int):
+        self.fast = _EMAState(fast)
+        self.slow = _EMAState(slow)
+        self.signal = _EMAState(signal)
+
+    def update(self, bar: Dict) -> Dict[str, Optional[float]]:
+        fast = self.fast.update(bar["close"])
+        slow = self.slow.update(bar["close"])
+        if slow is None:
+            return {"macd": None, "signal": None, "histogram": None}
+
+        line = fast - slow
+        signal = self.signal.update(line)
+        return {
+            "macd": line,
+            "signal": signal,
+            "histogram": line - signal if signal is not None else None
+        }
+
+
+class BollingerState:
+    def __init__(self, period: int, stddev: float):
+        self.window = _WindowState(period)
+        self.stddev = stddev
+
+    def update(self, bar: Dict) -> Dict[str, Optional[float]]:
+        if not self.window.update(bar["close"]):
+            return {"middle": None, "upper": None, "lower": None}
+
+        period = self.window.period
+        middle = self.window.total / period
+        deviation = max(self.window.total_sq / period - middle * middle, 0.0) ** 0.5
+        return {
+            "middle": middle,
+            "upper": middle + self.stddev * deviation,
+            "lower": middle - self.stddev * deviation
+        }
+
+
+class VWAPState:
+    def __init__(self):
+        self.day: Optional[int] = None
+        self.cum_pv = 0.0
+        self.cum_volume = 0.0
+
+    def update(self, bar: Dict) -> Dict[str, Optional[float]]:
+        day = bar["time"] // 86400
+        if day != self.day:
+            self.day = day
+            self.cum_pv = 0.0
+            self.cum_volume = 0.0
+
+        self.cum_pv += (bar["high"] + bar["low"] + bar["close"]) / 3.0 * bar["volume"]
+        self.cum_volume += bar["volume"]
+        return {"vwap": self.cum_pv / self.cum_volume if self.cum_volume else None}
+
+
+STREAM_STATES = {
+    "sma": SMAState,
+    "ema": EMAState,
+    "rsi": RSIState,
+    "macd": MACDState,
+    "bollinger": BollingerState,
+    "vwap": VWAPState,
+}
+
+
+def _to_list(values: np.ndarray) -> List[Optional[float]]:
+    """NaN -> None for JSON"""
+    return [None if v != v else v for v in values.tolist()]
+
+
+class _Stream:
+    __slots__ = ("state", "last_time", "values")
+
+    def __init__(self, state, last_time: int, values: Dict[str, Optional[float]]):
+        self.state = state
+        self.last_time = last_time
+        self.values = values
+
+
+class IndicatorEngine:
+    """
+    Indicator series on request and live indicator streams.
+
+    Flow:
+    1. get_series() computes an indicator over the latest candles (plus
+       warmup bars) with the vectorized kernels. Results are cached per
+       (symbol, interval, indicator, params) and reused until a new candle
+       or a new price changes the input.
+    2. open_stream() seeds a streaming state from closed history once per
+       key; afterwards on_bar_close() (candle builder close listener)
+       advances it in O(1) per bar and hands the values to the update
+       listeners (WebSocket push).
+    3. A bar gap (missed close) is replayed from the candle builder's
+       closed bars; only if the builder doesn't hold them is the stream
+       reseeded. Seeds always reach the last closed bar (cached history,
+       then builder bars, then the exchange for whatever is left) and push
+       their values like any other update.
+    4. Streams are only touched on the event loop: the candle builder
+       delivers close events there, and on_bar_close() forwards any call
+       from another thread to the loop the streams were opened on.
+    """
+
+    def __init__(self):
+        self._streams: Dict[StreamKey, _Stream] = {}
+        self._seeding: Dict[StreamKey, asyncio.Task] = {}
+        self._update_listeners: List[Callable[[StreamKey, int, Dict], None]] = []
+
+        # {key: (input version, series)} - LRU bounded
+        self._results: "OrderedDict[StreamKey, Tuple[tuple, Dict]]" = OrderedDict()
+
+        # Loop owning the streams (set by the first open_stream)
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def _on_loop(self) -> bool:
+        try:
+            return asyncio.get_running_loop() is self._loop
+        except RuntimeError:
+            return False
+
+    def add_update_listener(self, listener: Callable[[StreamKey, int, Dict], None]):
+        """Register a callback for every streamed value (key, bar time, values)"""
+        self._update_listeners.append(listener)
+
+    @staticmethod
+    def stream_key(symbol: str, interval: str, indicator: str, params: Tuple) -> StreamKey:
+        return (symbol.upper(), interval, indicator, params)
+
+    async def _candles(self, symbol: str, interval: str, count: int) -> List[Dict]:
+        candles = candle_builder.get_candles(symbol, interval, count)
+        if candles is None:
+            candles = await candle_service.get_latest(symbol, interval, count)
+        return candles
+
+    async def _closed_history(self, symbol: str, interval: str, count: int) -> List[Dict]:
+        """
+        Newest `count` closed bars up to the last close. Cached history may
+        lag (its open chunk is served stale), so it is extended with the
+        builder's closed bars and the rest is fetched past the cache.
+        """
+        seconds = INTERVAL_SECONDS[interval]
+        current = current_open_time(interval)
+
+        candles = await candle_service.get_latest(symbol, interval, count + 1)
+        closed = [c for c in candles if c["time"] < current]
+        after = closed[-1]["time"] if closed else current - (count + 1) * seconds
+
+        live = candle_builder.closed_bars(symbol, interval, after)
+        first_live = live[0]["time"] if live else current
+        if first_live > after + seconds:
+            closed += await fetch_candle_range(
+                candle_service.binance, symbol, interval, after + seconds, first_live - seconds
+            )
+        closed += [bar for bar in live if bar["time"] < current]
+
+        return closed[-count:]
+
+    async def get_series(self, symbol: str, interval: str, indicator: str, params: Tuple, limit: int) -> Dict:
+        """Latest `limit` values as {"time": [...], "values": {output: [...]}}"""
+        key = self.stream_key(symbol, interval, indicator, params)
+        param_dict = dict(params)
+        candles = await self._candles(symbol, interval, history_bars(indicator, param_dict, interval))
+        if not candles:
+            return {"time": [], "values": {}}
+
+        last = candles[-1]
+        version = (len(candles), last["time"], last["close"], last["volume"])
+        cached = self._results.get(key)
+
+        if cached is not None and cached[0] == version:
+            series = cached[1]
+            self._results.move_to_end(key)
+        else:
+            outputs = compute_indicator(indicator, candles, param_dict)
+            series = {
+                "time": [c["time"] for c in candles],
+                "values": {name: _to_list(values) for name, values in outputs.items()}
+            }
+            self._results[key] = (version, series)
+            self._results.move_to_end(key)
+            while len(self._results) > settings.INDICATOR_CACHE_SIZE:
+                self._results.popitem(last=False)
+
+        return {
+            "time": series["time"][-limit:],
+            "values": {name: values[-limit:] for name, values in series["values"].items()}
+        }
+
+    async def open_stream(self, symbol: str, interval: str, indicator: str, params: Tuple) -> Dict:
+        """Make sure a live stream exists for the key; returns its latest values"""
+        key = self.stream_key(symbol, interval, indicator, params)
+        self._loop = asyncio.get_running_loop()
+
+        if key not in self._streams:
+            await asyncio.shield(self._start_seed(key))
+
+        stream = self._streams.get(key)
+        if stream is None:
+            return {"time": None, "values": {}}
+        return {"time": stream.last_time, "values": stream.values}
+
+    def close_stream(self, key: StreamKey):
+        self._streams.pop(key, None)
+
+    def close_symbol(self, symbol: str):
+        """Drop every stream of a symbol (its trade stream was torn down)"""
+        for key in [key for key in self._streams if key[0] == symbol.upper()]:
+            self._streams.pop(key, None)
+
+    async def _seed(self, key: StreamKey):
+        symbol, interval, indicator, params = key
+        param_dict = dict(params)
+
+        closed = await self._closed_history(symbol, interval, history_bars(indicator, param_dict, interval))
+
+        state = STREAM_STATES[indicator](**param_dict)
+        values: Dict[str, Optional[float]] = {}
+        for bar in closed:
+            values = state.update(bar)
+
+        last_time = closed[-1]["time"] if closed else 0
+        self._streams[key] = _Stream(state, last_time, values)
+        logger.info(f"📈 Seeded {indicator} stream for {symbol} {interval} from {len(closed)} bars")
+
+        # Subscribers of a reseeded stream get the rebuilt values right away
+        if closed:
+            self._notify(key, last_time, values)
+
+    def on_bar_close(self, symbol: str, interval: str, bar: Dict):
+        """Candle builder close listener: advance every stream of this symbol/interval"""
+        if self._loop is None:
+            # No stream opened yet
+            return
+        if not self._on_loop():
+            self._loop.call_soon_threadsafe(self.on_bar_close, symbol, interval, bar)
+            return
+
+        seconds = INTERVAL_SECONDS[interval]
+
+        for key, stream in list(self._streams.items()):
+            if key[0] != symbol or key[1] != interval:
+                continue
+            if bar["time"] <= stream.last_time:
+                continue
+
+            if stream.last_time and bar["time"] > stream.last_time + seconds:
+                # Missed closes (e.g. a close during seeding): replay them from
+                # the builder, or rebuild from history if it doesn't hold them
+                missed = [
+                    b for b in candle_builder.closed_bars(symbol, interval, stream.last_time)
+                    if b["time"] < bar["time"]
+                ]
+                if (not missed or missed[0]["time"] != stream.last_time + seconds
+                        or missed[-1]["time"] != bar["time"] - seconds):
+                    self._streams.pop(key, None)
+                    self._reseed(key)
+                    continue
+
+                for missed_bar in missed:
+                    self._advance(key, stream, missed_bar)
+
+            self._advance(key, stream, bar)
+
+    def _advance(self, key: StreamKey, stream: _Stream, bar: Dict):
+        stream.values = stream.state.update(bar)
+        stream.last_time = bar["time"]
+        self._notify(key, bar["time"], stream.values)
+
+    def _notify(self, key: StreamKey, bar_time: int, values: Dict):
+        for listener in self._update_listeners:
+            try:
+                listener(key, bar_time, values)
+            except Exception as e:
+                logger.error(f"Indicator update listener failed for {key}: {e}")
+
+    def _start_seed(self, key: StreamKey) -> asyncio.Task:
+        """Seed task for the key, shared by concurrent subscribers"""
+        task = self._seeding.get(key)
+        if task is None:
+            task = asyncio.create_task(self._seed(key))
+            self._seeding[key] = task
+            task.add_done_callback(lambda done: self._seed_done(key, done))
+        return task
+
+    def _seed_done(self, key: StreamKey, task: asyncio.Task):
+        self._seeding.pop(key, None)
+        if not task.cancelled() and task.exception() is not None:
+            logger.error(f"Failed to seed indicator stream {key}: {task.exception()}")
+
+    def _reseed(self, key: StreamKey):
+        # Only called from on_bar_close, which runs on the streams' loop
+        self._start_seed(key)
+
+
+# -------------------------
+# Global singleton instance
+# -------------------------
+indicator_engine = IndicatorEngine()
+candle_builder.add_close_listener(indicator_engine.on_bar_close)
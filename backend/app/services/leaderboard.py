@@ -17,6 +17,7 @@ class LeaderboardService:
         1. Calculate user's PNL using TradingEngine
         2. Store user's PNL inside Redis Sorted Set (leaderboard)
         3. Cache user's detailed PNL data for faster fetch
+        4. Publish the new ranking for WebSocket broadcast (all workers)
         """
         from .trading_engine import TradingEngine
         
@@ -40,12 +41,34 @@ class LeaderboardService:
                 json.dumps(pnl_data)
             )
             
+            # STEP 4: Publish ranking update (picked up by the pub/sub bridge)
+            self._publish_leaderboard_update(user_id, tournament_id, pnl_data)
+            
             logger.info(f"Updated leaderboard for user {user_id} in tournament {tournament_id}")
             
         except Exception as e:
             logger.error(f"Error updating leaderboard: {str(e)}")
             raise
     
+    def _publish_leaderboard_update(self, user_id: int, tournament_id: int, pnl_data: Dict):
+        """Publish a user's new rank to Redis for WebSocket broadcast"""
+        key = f"tournament:{tournament_id}:leaderboard"
+        rank = self.redis.zrevrank(key, str(user_id))
+        
+        message = {
+            "type": "leaderboard_update",
+            "tournament_id": tournament_id,
+            "data": [{
+                "rank": rank + 1 if rank is not None else None,
+                "user_id": user_id,
+                "pnl": pnl_data['pnl'],
+                "pnl_percentage": pnl_data.get('pnl_percentage', 0),
+                "portfolio_value": pnl_data.get('total_portfolio_value', 0)
+            }]
+        }
+        
+        self.redis.publish(f"tournament:{tournament_id}:leaderboard_updates", json.dumps(message))
+    
     def update_all_rankings(self, tournament_id: int):
         """
         FLOW:
@@ -0,0 +1,138 @@
+import time
+import asyncio
+from typing import Callable, Dict, Iterable, Optional
+import redis.asyncio as aioredis
+from ..config import settings
+from ..utils.logger import logger
+
+# Lease held by the elected market-data ingestor
+INGESTOR_LEASE_KEY = "market:ingestor:lease"
+
+# Symbols requested by API workers: {symbol: expiry (unix seconds)}
+INTEREST_KEY = "market:symbols"
+
+
+def stream_key(symbol: str) -> str:
+    """Redis Stream carrying the normalized trade ticks of one symbol"""
+    return f"market:trades:{symbol.upper()}"
+
+
+def encode_tick(trade: dict) -> dict:
+    """Normalized trade (BinanceService._parse_trade) -> stream entry fields"""
+    return {
+        "symbol": trade["symbol"],
+        "price": repr(trade["price"]),
+        "quantity": repr(trade["quantity"]),
+        "timestamp": trade["timestamp"],
+        "trade_id": trade["trade_id"],
+        "is_buyer_maker": int(trade["is_buyer_maker"]),
+        "gap_before": int(trade.get("gap_before", False)),
+    }
+
+
+def decode_tick(fields: dict) -> dict:
+    """Stream entry fields (bytes) -> normalized trade"""
+    return {
+        "symbol": fields[b"symbol"].decode(),
+        "price": float(fields[b"price"]),
+        "quantity": float(fields[b"quantity"]),
+        "timestamp": int(fields[b"timestamp"]),
+        "trade_id": int(fields[b"trade_id"]),
+        "is_buyer_maker": fields[b"is_buyer_maker"] == b"1",
+        "gap_before": fields.get(b"gap_before") == b"1",
+    }
+
+
+class MarketStreamConsumer:
+    """
+    API-worker side of MARKET_DATA_MODE=ingestor.
+
+    Flow:
+    1. add() announces a symbol to the ingestor (interest zset entry that
+       expires unless renewed) and starts reading its Redis Stream right
+       after the newest entry.
+    2. One read loop XREADs every symbol in batches of
+       MARKET_STREAM_READ_COUNT, blocking up to MARKET_STREAM_BLOCK_MS, and
+       hands each tick to on_tick. That feeds the candle builder and the
+       price conflator, so conflation happens here on the consumer side and
+       a burst of ticks still costs one broadcast per flush.
+    3. While a symbol is read its interest is renewed; remove() stops
+       reading and lets it expire, after which the ingestor drops the
+       Binance stream unless another worker still asks for it.
+    """
+
+    def __init__(self, redis_url: str, on_tick: Callable[[str, dict], None]):
+        self.redis = aioredis.from_url(redis_url)
+        self.on_tick = on_tick
+
+        # {symbol: id of the last entry read}
+        self._offsets: Dict[str, str] = {}
+        self._renewed_at = 0.0
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self.run())
+            logger.info("📡 Reading market data from Redis Streams")
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        await self.redis.close()
+
+    def is_reading(self, symbol: str) -> bool:
+        return symbol.upper() in self._offsets
+
+    async def add(self, symbol: str):
+        """Start reading a symbol's ticks (picked up by the next XREAD)"""
+        symbol = symbol.upper()
+        if symbol in self._offsets:
+            return
+
+        await self._renew_interest([symbol])
+        newest = await self.redis.xrevrange(stream_key(symbol), count=1)
+        self._offsets[symbol] = newest[0][0].decode() if newest else "0-0"
+
+    def remove(self, symbol: str):
+        """Stop reading a symbol; its interest expires on its own"""
+        self._offsets.pop(symbol.upper(), None)
+
+    async def _renew_interest(self, symbols: Iterable[str]):
+        expires_at = time.time() + settings.MARKET_INTEREST_TTL_SECONDS
+        await self.redis.zadd(INTEREST_KEY, {symbol: expires_at for symbol in symbols})
+
+    async def run(self):
+        while True:
+            try:
+                if not self._offsets:
+                    await asyncio.sleep(settings.MARKET_STREAM_BLOCK_MS / 1000)
+                    continue
+
+                if time.monotonic() - self._renewed_at >= settings.MARKET_INTEREST_TTL_SECONDS / 3:
+                    await self._renew_interest(list(self._offsets))
+                    self._renewed_at = time.monotonic()
+
+                response = await self.redis.xread(
+                    {stream_key(symbol): offset for symbol, offset in self._offsets.items()},
+                    count=settings.MARKET_STREAM_READ_COUNT,
+                    block=settings.MARKET_STREAM_BLOCK_MS
+                )
+
+                for _, entries in response or []:
+                    for _, fields in entries:
+                        tick = decode_tick(fields)
+                        try:
+                            self.on_tick(tick["symbol"], tick)
+                        except Exception as e:
+                            logger.error(f"Market tick handler failed for {tick['symbol']}: {e}")
+
+                    # Removed while the read was in flight: don't resurrect it
+                    if tick["symbol"] in self._offsets:
+                        self._offsets[tick["symbol"]] = entries[-1][0].decode()
+
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Market stream read failed, retrying: {e}")
+                await asyncio.sleep(settings.PUBSUB_RECONNECT_SECONDS)
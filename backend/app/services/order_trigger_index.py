@@ -0,0 +1,267 @@
+import bisect
+import json
+import uuid
+import asyncio
+import redis
+from threading import Lock
+from typing import Dict, List, Optional, Set, Tuple
+from sqlalchemy.orm import Session
+from ..config import settings
+from ..models.demo_order import DemoOrder
+from ..utils.logger import logger
+
+# Index changes shared between uvicorn workers (see websocket/streams.py)
+ORDER_INDEX_CHANNEL = "orders:trigger_index"
+
+
+class _SymbolTriggers:
+    """Sorted (trigger_price, order_id) lists for one symbol"""
+
+    def __init__(self):
+        # Ascending by price. Which end of each list fires:
+        #   buy_tp  - price >= tp  -> prefix
+        #   buy_sl  - price <= sl  -> suffix
+        #   sell_tp - price <= tp  -> suffix
+        #   sell_sl - price >= sl  -> prefix
+        self.buy_tp: List[Tuple[float, int]] = []
+        self.buy_sl: List[Tuple[float, int]] = []
+        self.sell_tp: List[Tuple[float, int]] = []
+        self.sell_sl: List[Tuple[float, int]] = []
+
+        # Every open order on the symbol, with or without SL/TP
+        self.order_ids: Set[int] = set()
+
+    def lists_for(self, side: str) -> Tuple[List, List]:
+        if side == "BUY":
+            return self.buy_tp, self.buy_sl
+        return self.sell_tp, self.sell_sl
+
+
+class OrderTriggerIndex:
+    """
+    In-memory SL/TP trigger index for OPEN demo orders.
+
+    Flow:
+    1. Rebuilt from the DB at startup, then kept current as orders are
+       placed (add) and closed (remove).
+    2. On each tick, triggered(symbol, low, high) bisects the per-symbol
+       sorted lists and returns only the orders whose thresholds were crossed
+       in O(log n + k), instead of scanning every open order.
+    3. Every worker keeps its own copy: add/remove are published on
+       ORDER_INDEX_CHANNEL and applied by the other workers (apply_remote),
+       so the worker streaming a symbol sees orders placed through any
+       worker. run_index_reconcile() rebuilds from the DB periodically in
+       case a message was lost.
+    """
+
+    def __init__(self):
+        self._symbols: Dict[str, _SymbolTriggers] = {}
+
+        # {order_id: order snapshot} - everything needed without a DB hit
+        self._orders: Dict[int, dict] = {}
+        self._lock = Lock()
+
+        # Changes made while a rebuild's DB query runs, replayed onto its result
+        self._journal: Optional[List[Tuple[str, object]]] = None
+
+        self.origin = uuid.uuid4().hex
+        self._redis: Optional[redis.Redis] = None
+
+    @staticmethod
+    def _snapshot(order: DemoOrder) -> dict:
+        return {
+            "id": order.id,
+            "user_id": order.user_id,
+            "symbol": order.symbol,
+            "side": order.side,
+            "size": order.size,
+            "entry_price": order.entry_price,
+            "stop_loss": order.stop_loss,
+            "take_profit": order.take_profit,
+        }
+
+    def add(self, order: DemoOrder):
+        """Index an OPEN order (replaces any previous entry for it)"""
+        entry = self._snapshot(order)
+        self._add_entry(entry)
+        self._publish({"op": "add", "order": entry})
+
+    def remove(self, order_id: int):
+        """Drop a closed order from the index"""
+        self._remove_entry(order_id)
+        self._publish({"op": "remove", "order_id": order_id})
+
+    def apply_remote(self, message: dict):
+        """Apply an add/remove published by another worker"""
+        if message.get("origin") == self.origin:
+            return
+        if message["op"] == "add":
+            self._add_entry(message["order"])
+        elif message["op"] == "remove":
+            self._remove_entry(message["order_id"])
+
+    def _add_entry(self, entry: dict):
+        with self._lock:
+            self._remove_locked(entry["id"])
+            self._index(entry, self._symbols, self._orders)
+            if self._journal is not None:
+                self._journal.append(("add", entry))
+
+    def _remove_entry(self, order_id: int):
+        with self._lock:
+            self._remove_locked(order_id)
+            if self._journal is not None:
+                self._journal.append(("remove", order_id))
+
+    def _publish(self, message: dict):
+        if not settings.PUBSUB_BRIDGE_ENABLED:
+            return
+
+        try:
+            if self._redis is None:
+                self._redis = redis.from_url(settings.REDIS_URL)
+            self._redis.publish(ORDER_INDEX_CHANNEL, json.dumps({"origin": self.origin, **message}))
+        except Exception as e:
+            # The periodic reconcile picks the change up on the other workers
+            logger.warning(f"Failed to publish trigger index change: {e}")
+
+    @staticmethod
+    def _index(entry: dict, symbols: Dict[str, _SymbolTriggers], orders: Dict[int, dict]):
+        orders[entry["id"]] = entry
+
+        triggers = symbols.setdefault(entry["symbol"], _SymbolTriggers())
+        triggers.order_ids.add(entry["id"])
+        tp_list, sl_list = triggers.lists_for(entry["side"])
+        if entry["take_profit"]:
+            bisect.insort(tp_list, (entry["take_profit"], entry["id"]))
+        if entry["stop_loss"]:
+            bisect.insort(sl_list, (entry["stop_loss"], entry["id"]))
+
+    def _remove_locked(self, order_id: int):
+        entry = self._orders.pop(order_id, None)
+        if entry is None:
+            return
+
+        triggers = self._symbols.get(entry["symbol"])
+        if triggers is None:
+            return
+
+        triggers.order_ids.discard(order_id)
+        tp_list, sl_list = triggers.lists_for(entry["side"])
+        for items, price in ((tp_list, entry["take_profit"]), (sl_list, entry["stop_loss"])):
+            if not price:
+                continue
+            i = bisect.bisect_left(items, (price, order_id))
+            if i < len(items) and items[i] == (price, order_id):
+                del items[i]
+
+    def triggered(self, symbol: str, low: float, high: Optional[float] = None) -> Dict[int, str]:
+        """
+        Orders whose SL or TP was crossed by prices in [low, high].
+        Returns {order_id: "TP_HIT" | "SL_HIT"}; TP wins if both were crossed.
+        """
+        if high is None:
+            high = low
+
+        with self._lock:
+            triggers = self._symbols.get(symbol)
+            if triggers is None:
+                return {}
+
+            hits: Dict[int, str] = {}
+
+            # Take-profits first so they take precedence over stop-losses
+            for _, order_id in triggers.buy_tp[:bisect.bisect_right(triggers.buy_tp, (high, float("inf")))]:
+                hits[order_id] = "TP_HIT"
+            for _, order_id in triggers.sell_tp[bisect.bisect_left(triggers.sell_tp, (low, -1)):]:
+                hits[order_id] = "TP_HIT"
+
+            for _, order_id in triggers.buy_sl[bisect.bisect_left(triggers.buy_sl, (low, -1)):]:
+                hits.setdefault(order_id, "SL_HIT")
+            for _, order_id in triggers.sell_sl[:bisect.bisect_right(triggers.sell_sl, (high, float("inf")))]:
+                hits.setdefault(order_id, "SL_HIT")
+
+            return hits
+
+    def get(self, order_id: int) -> Optional[dict]:
+        with self._lock:
+            return self._orders.get(order_id)
+
+    def open_orders(self, symbol: str) -> List[dict]:
+        """Snapshots of every open order on a symbol"""
+        with self._lock:
+            triggers = self._symbols.get(symbol)
+            if triggers is None:
+                return []
+            return [self._orders[order_id] for order_id in triggers.order_ids]
+
+    def symbols_with_open_orders(self) -> List[str]:
+        with self._lock:
+            return [symbol for symbol, triggers in self._symbols.items() if triggers.order_ids]
+
+    def rebuild(self, db: Session):
+        """
+        Reload every OPEN order from the DB.
+        The new index is built aside and swapped in; changes made while the
+        query ran are replayed onto it, so none are lost.
+        """
+        with self._lock:
+            self._journal = []
+
+        try:
+            open_orders = db.query(DemoOrder).filter(DemoOrder.status == "OPEN").all()
+
+            symbols: Dict[str, _SymbolTriggers] = {}
+            orders: Dict[int, dict] = {}
+            for order in open_orders:
+                self._index(self._snapshot(order), symbols, orders)
+
+            with self._lock:
+                self._symbols, self._orders = symbols, orders
+                for op, value in self._journal:
+                    if op == "add":
+                        self._remove_locked(value["id"])
+                        self._index(value, self._symbols, self._orders)
+                    else:
+                        self._remove_locked(value)
+        finally:
+            with self._lock:
+                self._journal = None
+
+        logger.info(f"🗂️ Rebuilt SL/TP trigger index with {len(open_orders)} open orders")
+
+
+def symbols_with_open_orders_in_db(db: Session) -> Set[str]:
+    """Symbols with OPEN demo orders according to the DB (every worker's orders)"""
+    rows = db.query(DemoOrder.symbol).filter(DemoOrder.status == "OPEN").distinct().all()
+    return {symbol for (symbol,) in rows}
+
+
+def _reconcile():
+    from ..db import SessionLocal
+
+    db = SessionLocal()
+    try:
+        order_trigger_index.rebuild(db)
+    finally:
+        db.close()
+
+
+async def run_index_reconcile():
+    """
+    Safety net for the cross-worker index updates: every
+    ORDER_INDEX_RECONCILE_SECONDS, rebuild the index from the DB off the
+    event loop (covers messages lost while the pub/sub bridge reconnected).
+    """
+    while True:
+        await asyncio.sleep(settings.ORDER_INDEX_RECONCILE_SECONDS)
+        try:
+            await asyncio.to_thread(_reconcile)
+        except Exception as e:
+            logger.error(f"Trigger index reconcile failed: {e}", exc_info=True)
+
+
+# -------------------------
+# Global singleton instance
+# -------------------------
+order_trigger_index = OrderTriggerIndex()
@@ -0,0 +1,48 @@
+import asyncio
+from ..config import settings
+from ..db import SessionLocal
+from ..utils.logger import logger
+from .binance_service import get_binance_service
+from .demo_trading_engine import DemoTradingEngine
+from .order_trigger_index import order_trigger_index
+
+
+def _snapshot(prices: dict) -> int:
+    db = SessionLocal()
+    try:
+        return DemoTradingEngine.snapshot_open_orders(db, prices)
+    finally:
+        db.close()
+
+
+async def run_pnl_snapshots():
+    """
+    Periodic mark-to-market job.
+    
+    Flow:
+    1. Every PNL_SNAPSHOT_INTERVAL_SECONDS, collect the live price of each
+       symbol that has open orders.
+    2. Persist current_price/pnl of all those orders in one batched UPDATE,
+       off the event loop.
+    
+    Ticks never write PnL; reads compute it from the live price instead.
+    """
+    binance = get_binance_service()
+    
+    while True:
+        await asyncio.sleep(settings.PNL_SNAPSHOT_INTERVAL_SECONDS)
+        
+        prices = {}
+        for symbol in order_trigger_index.symbols_with_open_orders():
+            price = binance.get_cached_price(symbol)
+            if price is not None:
+                prices[symbol] = price
+        
+        if not prices:
+            continue
+        
+        try:
+            updated = await asyncio.to_thread(_snapshot, prices)
+            logger.info(f"📸 Snapshotted PnL for {updated} open orders across {len(prices)} symbols")
+        except Exception as e:
+            logger.error(f"PnL snapshot failed: {e}", exc_info=True)
@@ -9,14 +9,14 @@ from ..models.position import Position
 from ..models.wallet import Wallet
 from ..models.user import User
 from ..models.tournament import Tournament
-from ..services.binance_service import BinanceService
+from ..services.binance_service import BinanceService, get_binance_service
 from ..utils.logger import logger
 
 class TradingEngine:
-    def __init__(self, db: Session, redis_client: redis.Redis):
+    def __init__(self, db: Session, redis_client: redis.Redis, binance: Optional[BinanceService] = None):
         self.db = db
         self.redis = redis_client
-        self.binance = BinanceService()
+        self.binance = binance or get_binance_service()
     
     def execute_trade(
         self, 
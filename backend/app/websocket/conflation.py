@@ -0,0 +1,93 @@
+import asyncio
+from threading import Lock
+from typing import Awaitable, Callable, Dict, Optional
+from ..utils.logger import logger
+
+
+class TickConflator:
+    """
+    Conflation stage between the Binance trade stream and WebSocket clients.
+
+    Flow:
+    1. push() is called for every raw trade tick (cheap, no coroutine).
+    2. Only the latest tick per symbol is kept, together with the high, low,
+       volume and trade count seen since the last flush. "quantity" carries
+       the same volume so client-side candle volume stays correct.
+    3. A single flush loop hands one conflated tick per symbol to the flush
+       callback at `rate_hz`, so fan-out cost is bounded by the flush rate
+       instead of by market activity.
+    """
+
+    def __init__(self, flush_callback: Callable[[str, dict], Awaitable], rate_hz: float):
+        self.flush_callback = flush_callback
+        self.interval = 1.0 / rate_hz
+
+        # {symbol: conflated tick}
+        self._pending: Dict[str, dict] = {}
+        self._lock = Lock()
+        self._task: Optional[asyncio.Task] = None
+
+    def push(self, symbol: str, tick: dict):
+        """Merge a raw tick into the symbol's pending bucket"""
+        price = tick["price"]
+        quantity = tick.get("quantity", 0.0)
+
+        with self._lock:
+            bucket = self._pending.get(symbol)
+
+            if bucket is None:
+                self._pending[symbol] = {
+                    **tick,
+                    "high": price,
+                    "low": price,
+                    "volume": quantity,
+                    "trade_count": 1,
+                }
+                return
+
+            high = max(bucket["high"], price)
+            low = min(bucket["low"], price)
+            volume = bucket["volume"] + quantity
+            trade_count = bucket["trade_count"] + 1
+
+            bucket.update(tick)
+            bucket["high"] = high
+            bucket["low"] = low
+            bucket["volume"] = volume
+            bucket["quantity"] = volume
+            bucket["trade_count"] = trade_count
+
+    def start(self):
+        """Start the flush loop on the running event loop (idempotent)"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+            logger.info(f"⏱️ Tick conflation started ({1.0 / self.interval:g} Hz)")
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def flush(self):
+        """Hand every pending conflated tick to the flush callback"""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+
+        if not pending:
+            return
+
+        results = await asyncio.gather(
+            *(self.flush_callback(symbol, tick) for symbol, tick in pending.items()),
+            return_exceptions=True
+        )
+        for symbol, result in zip(pending, results):
+            if isinstance(result, Exception):
+                logger.error(f"Error flushing ticks for {symbol}: {result}")
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"Tick conflation flush failed: {e}", exc_info=True)
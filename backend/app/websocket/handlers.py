@@ -2,23 +2,247 @@ from fastapi import WebSocket
 import json
 from typing import Dict
 from .manager import manager
-from ..services.binance_service import BinanceService
+from .conflation import TickConflator
+from .tick_pipeline import TickPipeline
+from .streams import StreamHandler
+from ..services.binance_service import get_binance_service
+from ..services.candle_builder import INTERVAL_SECONDS, candle_builder
+from ..services.indicator_engine import indicator_engine, normalize_params
 from ..services.leaderboard import LeaderboardService
+from ..services.market_stream import MarketStreamConsumer
 from ..utils.logger import logger
 import redis
 from ..config import settings
 import asyncio
+import time
 
 # -------------------------
 # Initialize services
 # -------------------------
-binance_service = BinanceService()
+binance_service = get_binance_service()
 redis_client = redis.from_url(settings.REDIS_URL)
 
 # Track active Binance subscriptions to avoid duplicates
 _active_binance_subs = set()
-# Store the main event loop for cross-thread scheduling
-_main_loop = None
+
+# {symbol: monotonic time since which its stream has had no users}
+_idle_since: Dict[str, float] = {}
+
+# Cross-worker fan-out; prices of symbols streamed here are delivered locally
+stream_handler = StreamHandler(settings.REDIS_URL, is_local_feed=lambda symbol: symbol in _active_binance_subs)
+
+
+async def _flush_conflated_tick(symbol: str, price_data: dict):
+    """Deliver one conflated tick: broadcast it (here and to other workers), stream candles and PnL, run the SL/TP check"""
+    await asyncio.gather(
+        manager.broadcast_price_update(symbol, price_data),
+        stream_handler.publish_price(symbol, price_data),
+        stream_live_klines(symbol),
+        stream_unrealized_pnl(symbol, price_data),
+        handle_price_tick_for_trading(symbol, price_data)
+    )
+
+
+async def stream_live_klines(symbol: str):
+    """Push the bar in progress of every interval that has candle subscribers"""
+    for (sub_symbol, interval), subscribers in list(manager.candle_subscriptions.items()):
+        if sub_symbol != symbol.upper() or not subscribers:
+            continue
+        
+        current = candle_builder.get_candles(symbol, interval, 1)
+        if current:
+            await manager.broadcast_kline_update(sub_symbol, interval, current[-1], closed=False)
+
+
+def _push_closed_kline(symbol: str, interval: str, bar: dict):
+    """Candle builder close listener: push closed bars to candle subscribers"""
+    if not manager.candle_subscriptions.get((symbol, interval)):
+        return
+    
+    asyncio.get_running_loop().create_task(manager.broadcast_kline_update(symbol, interval, bar, closed=True))
+
+candle_builder.add_close_listener(_push_closed_kline)
+
+
+async def stream_unrealized_pnl(symbol: str, price_data: dict):
+    """
+    Push unrealized PnL of open orders to their connected owners.
+    Computed from the live price and the trigger index; nothing is written
+    to the DB (see services/pnl_snapshot.py for the periodic persist).
+    """
+    from ..services.order_trigger_index import order_trigger_index
+    
+    current_price = price_data.get("price") or price_data.get("last_price")
+    if not current_price:
+        return
+    
+    positions: Dict[int, list] = {}
+    for order in order_trigger_index.open_orders(symbol):
+        if order["user_id"] not in manager.active_connections:
+            continue
+        
+        if order["side"] == "BUY":
+            pnl = (current_price - order["entry_price"]) * order["size"]
+        else:
+            pnl = (order["entry_price"] - current_price) * order["size"]
+        
+        positions.setdefault(order["user_id"], []).append({
+            "id": order["id"],
+            "current_price": current_price,
+            "pnl": pnl,
+        })
+    
+    for user_id, orders in positions.items():
+        await manager.send_personal_message({
+            "type": "pnl_update",
+            "symbol": symbol,
+            "data": orders
+        }, user_id, key=f"pnl_update:{symbol}")
+
+# Raw trade ticks are conflated per symbol and flushed at PRICE_FLUSH_HZ
+price_conflator = TickConflator(_flush_conflated_tick, settings.PRICE_FLUSH_HZ)
+
+
+def _on_market_tick(symbol: str, price_data: dict):
+    """
+    Every trade tick, from Binance directly or from the ingestor's stream:
+    update the in-memory candles and hand it to the conflation stage.
+    """
+    # Feed-internal marker, not part of the broadcast tick
+    gap_before = price_data.pop('gap_before', False)
+    candle_builder.add_trade(
+        symbol, price_data['price'], price_data['quantity'], price_data['timestamp'],
+        gap_before=gap_before
+    )
+    price_conflator.push(symbol, price_data)
+
+
+def _on_streamed_tick(symbol: str, price_data: dict):
+    """Ingestor mode: ticks read from Redis Streams also keep the price cache warm"""
+    binance_service.ingest_trade(price_data)
+    _on_market_tick(symbol, price_data)
+
+# MARKET_DATA_MODE=ingestor: ticks come from the elected ingestor via Redis Streams
+market_feed = MarketStreamConsumer(settings.REDIS_URL, _on_streamed_tick)
+
+
+async def ensure_binance_stream(symbol: str):
+    """
+    Start the Binance trade stream for a symbol if not already active.
+    Every trade updates the in-memory candles and is handed to the
+    conflation stage; broadcasts and SL/TP checks run on flush.
+    
+    In ingestor mode the symbol is requested from the market-data ingestor
+    and read from its Redis Stream instead of opening a Binance socket here.
+    """
+    symbol = symbol.upper()
+    if symbol in _active_binance_subs:
+        return
+    
+    def price_callback(price_data):
+        """
+        Callback for Binance TRADE updates.
+        Receives EVERY trade execution in real-time.
+        """
+        _on_market_tick(symbol, price_data)
+    
+    candle_builder.track(symbol)
+    if settings.MARKET_DATA_MODE == "ingestor":
+        await market_feed.add(symbol)
+        _active_binance_subs.add(symbol)
+        logger.info(f"🚀 Reading {symbol} from the market-data ingestor")
+        return
+    
+    await binance_service.subscribe_to_trade(symbol, price_callback)
+    _active_binance_subs.add(symbol)
+    logger.info(f"🚀 Started Binance stream for {symbol}")
+
+
+async def release_binance_stream(symbol: str):
+    """Tear down a symbol's upstream stream and the in-memory state it fed"""
+    _active_binance_subs.discard(symbol)
+    _idle_since.pop(symbol, None)
+    candle_builder.untrack(symbol)
+    indicator_engine.close_symbol(symbol)
+    tick_pipeline.stop(symbol)
+    
+    if settings.MARKET_DATA_MODE == "ingestor":
+        market_feed.remove(symbol)
+    else:
+        await binance_service.unsubscribe(symbol, "trade")
+    logger.info(f"🛑 Released {symbol} stream (no subscribers or open orders)")
+
+
+def _symbols_with_open_orders_in_db() -> set:
+    from ..db import SessionLocal
+    from ..services.order_trigger_index import symbols_with_open_orders_in_db
+    
+    db = SessionLocal()
+    try:
+        return symbols_with_open_orders_in_db(db)
+    finally:
+        db.close()
+
+
+async def run_idle_stream_sweeper():
+    """
+    Flow:
+    1. Every SYMBOL_IDLE_SWEEP_SECONDS, each active symbol stream is checked
+       for users: price, candle or indicator subscribers (the subscriber
+       sets are its reference count) and open demo orders, whose SL/TP
+       checks need the ticks.
+    2. A symbol without users for SYMBOL_IDLE_GRACE_SECONDS is released.
+       Any user in between resets its idle clock, so quick resubscribes
+       (page changes, reconnects) keep the stream.
+    3. Before releasing, open orders are confirmed against the DB (shared by
+       every worker): the local trigger index may not have seen an order
+       placed through another worker yet.
+    """
+    from ..services.order_trigger_index import order_trigger_index
+    
+    while True:
+        await asyncio.sleep(settings.SYMBOL_IDLE_SWEEP_SECONDS)
+        try:
+            with_orders = set(order_trigger_index.symbols_with_open_orders())
+            now = time.monotonic()
+            expired = []
+            
+            for symbol in list(_active_binance_subs):
+                if manager.has_market_subscribers(symbol) or symbol in with_orders:
+                    _idle_since.pop(symbol, None)
+                    continue
+                
+                if now - _idle_since.setdefault(symbol, now) >= settings.SYMBOL_IDLE_GRACE_SECONDS:
+                    expired.append(symbol)
+            
+            if not expired:
+                continue
+            
+            with_orders = await asyncio.to_thread(_symbols_with_open_orders_in_db)
+            for symbol in expired:
+                if symbol in with_orders:
+                    _idle_since.pop(symbol, None)
+                # Re-check: someone may have subscribed while the DB was queried
+                elif symbol in _active_binance_subs and not manager.has_market_subscribers(symbol):
+                    await release_binance_stream(symbol)
+        
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Idle stream sweep failed: {e}")
+
+
+def _push_indicator_update(key: tuple, bar_time: int, values: dict):
+    """Indicator engine listener: push a closed bar's values to the stream's subscribers"""
+    if not manager.indicator_subscriptions.get(key):
+        indicator_engine.close_stream(key)
+        return
+    
+    asyncio.get_running_loop().create_task(manager.broadcast_indicator_update(key, bar_time, values))
+
+indicator_engine.add_update_listener(_push_indicator_update)
+
+
 async def handle_websocket_message(websocket: WebSocket, user_id: int, message: dict):
     """
     Flow Summary:
@@ -27,10 +251,6 @@ async def handle_websocket_message(websocket: WebSocket, user_id: int, message:
     3. Performs action based on type (subscribe, fetch leaderboard, fetch price, ping).
     4. Sends response back to client using ConnectionManager.
     """
-    # Store the main event loop on first message
-    global _main_loop
-    if _main_loop is None:
-        _main_loop = asyncio.get_running_loop()
     message_type = message.get("type")
     logger.info(f"📨 Received message from user {user_id}: {message_type}")
     
@@ -54,44 +274,21 @@ async def handle_websocket_message(websocket: WebSocket, user_id: int, message:
     # Subscribe to symbol price updates
     # -------------------------
     elif message_type == "subscribe_symbol":
-        symbol = message.get("symbol", "BTCUSDT")
+        symbol = message.get("symbol", "BTCUSDT").upper()
         
         # Add user to symbol subscription set
         manager.subscribe_to_symbol(user_id, symbol)
         
         # Start Binance stream for this symbol if not already active
-        if symbol not in _active_binance_subs:
-            def price_callback(price_data):
-                """
-                Callback for Binance TRADE updates.
-                Receives EVERY trade execution in real-time.
-                """
-                if _main_loop and not _main_loop.is_closed():
-                    # Broadcast price to all users
-                    asyncio.run_coroutine_threadsafe(
-                        manager.broadcast_price_update(symbol, price_data),
-                        _main_loop)
-                    
-                    # Check and close orders on this price tick
-                    asyncio.run_coroutine_threadsafe(
-                        handle_price_tick_for_trading(symbol, price_data),
-                        _main_loop)
-                else:
-                    logger.warning(f"Cannot broadcast - main loop unavailable for {symbol}")
-            
-            # Use Binance ticker for UI-friendly updates (~1/sec)
-            # Use Binance ticker for UI-friendly updates (~1/sec)
-            try:
-                await binance_service.subscribe_to_trade(symbol, price_callback)
-                _active_binance_subs.add(symbol)
-                logger.info(f"🚀 Started Binance stream for {symbol}")
-            except Exception as e:
-                logger.error(f"Failed to subscribe to Binance: {e}")
-                await manager.send_personal_message({
-                    "type": "error",
-                    "message": f"Failed to subscribe to {symbol}: {str(e)}"
-                }, user_id)
-                return
+        try:
+            await ensure_binance_stream(symbol)
+        except Exception as e:
+            logger.error(f"Failed to subscribe to Binance: {e}")
+            await manager.send_personal_message({
+                "type": "error",
+                "message": f"Failed to subscribe to {symbol}: {str(e)}"
+            }, user_id)
+            return
             
         # Send confirmation back to client
         await manager.send_personal_message({
@@ -100,6 +297,127 @@ async def handle_websocket_message(websocket: WebSocket, user_id: int, message:
             "message": f"Subscribed to {symbol} price updates"
         }, user_id)
     
+    # -------------------------
+    # Unsubscribe from symbol price updates
+    # (the stream itself is released once idle, see run_idle_stream_sweeper)
+    # -------------------------
+    elif message_type == "unsubscribe_symbol":
+        symbol = message.get("symbol", "BTCUSDT").upper()
+        
+        manager.unsubscribe_from_symbol(user_id, symbol)
+        
+        await manager.send_personal_message({
+            "type": "unsubscription_confirmed",
+            "channel": f"price_{symbol}"
+        }, user_id)
+    
+    # -------------------------
+    # Subscribe to live candles (kline_update frames)
+    # -------------------------
+    elif message_type == "subscribe_candles":
+        symbol = message.get("symbol", "BTCUSDT").upper()
+        interval = message.get("interval", "1m")
+        
+        if interval not in INTERVAL_SECONDS:
+            await manager.send_personal_message({
+                "type": "error",
+                "message": f"Unsupported interval: {interval}"
+            }, user_id)
+            return
+        
+        try:
+            await ensure_binance_stream(symbol)
+        except Exception as e:
+            logger.error(f"Failed to subscribe to Binance: {e}")
+            await manager.send_personal_message({
+                "type": "error",
+                "message": f"Failed to subscribe to {symbol}: {str(e)}"
+            }, user_id)
+            return
+        
+        manager.subscribe_to_candles(user_id, symbol, interval)
+        current = candle_builder.get_candles(symbol, interval, 1)
+        
+        await manager.send_personal_message({
+            "type": "subscription_confirmed",
+            "channel": f"candles_{symbol}_{interval}",
+            "message": f"Subscribed to {symbol} {interval} candles",
+            "data": current[-1] if current else None
+        }, user_id)
+    
+    # -------------------------
+    # Unsubscribe from live candles
+    # -------------------------
+    elif message_type == "unsubscribe_candles":
+        symbol = message.get("symbol", "BTCUSDT").upper()
+        interval = message.get("interval", "1m")
+        
+        manager.unsubscribe_from_candles(user_id, symbol, interval)
+        
+        await manager.send_personal_message({
+            "type": "unsubscription_confirmed",
+            "channel": f"candles_{symbol}_{interval}"
+        }, user_id)
+    
+    # -------------------------
+    # Subscribe to a live indicator stream
+    # -------------------------
+    elif message_type == "subscribe_indicator":
+        symbol = message.get("symbol", "BTCUSDT").upper()
+        interval = message.get("interval", "1m")
+        indicator = message.get("indicator")
+        
+        try:
+            if interval not in INTERVAL_SECONDS:
+                raise ValueError(f"Unsupported interval: {interval}")
+            params = normalize_params(indicator, message.get("params"))
+            
+            # Indicators advance on closed bars from this symbol's trade stream
+            await ensure_binance_stream(symbol)
+            
+            snapshot = await indicator_engine.open_stream(symbol, interval, indicator, params)
+        except Exception as e:
+            logger.error(f"Failed to subscribe to indicator: {e}")
+            await manager.send_personal_message({
+                "type": "error",
+                "message": f"Failed to subscribe to {indicator} on {symbol}: {str(e)}"
+            }, user_id)
+            return
+        
+        # Registered only once the stream exists (no dangling subscription
+        # if seeding fails); nothing runs between open_stream and here
+        manager.subscribe_to_indicator(user_id, indicator_engine.stream_key(symbol, interval, indicator, params))
+        
+        await manager.send_personal_message({
+            "type": "subscription_confirmed",
+            "channel": f"indicator_{symbol}_{interval}_{indicator}",
+            "params": dict(params),
+            "data": snapshot
+        }, user_id)
+    
+    # -------------------------
+    # Unsubscribe from a live indicator stream
+    # -------------------------
+    elif message_type == "unsubscribe_indicator":
+        symbol = message.get("symbol", "BTCUSDT").upper()
+        interval = message.get("interval", "1m")
+        indicator = message.get("indicator")
+        
+        try:
+            params = normalize_params(indicator, message.get("params"))
+        except ValueError as e:
+            await manager.send_personal_message({"type": "error", "message": str(e)}, user_id)
+            return
+        
+        key = indicator_engine.stream_key(symbol, interval, indicator, params)
+        if manager.unsubscribe_from_indicator(user_id, key) == 0:
+            indicator_engine.close_stream(key)
+        
+        await manager.send_personal_message({
+            "type": "unsubscription_confirmed",
+            "channel": f"indicator_{symbol}_{interval}_{indicator}"
+        }, user_id)
+    
     # -------------------------
     # Fetch current leaderboard
     # -------------------------
@@ -139,7 +457,7 @@ async def handle_websocket_message(websocket: WebSocket, user_id: int, message:
         symbol = message.get("symbol", "BTCUSDT")
         try:
             # Get current price from BinanceService (cache first, REST fallback)
-            price = binance_service.get_current_price(symbol)
+            price = await binance_service.aget_current_price(symbol)
             
             # Send price back to client
             await manager.send_personal_message({
@@ -178,34 +496,61 @@ async def handle_websocket_message(websocket: WebSocket, user_id: int, message:
 # =========================================
 async def handle_price_tick_for_trading(symbol: str, price_data: dict):
     """
-    Called on every price tick.
+    Called on every (conflated) price tick.
     Checks if any open demo orders should be closed (SL/TP hit).
+    
+    The in-memory trigger index answers on the event loop; only ticks that
+    actually cross a threshold are handed to the tick pipeline, which does
+    the DB work on its thread pool.
+    """
+    from ..services.order_trigger_index import order_trigger_index
+    
+    # Extract current price
+    current_price = price_data.get("price") or price_data.get("last_price")
+    
+    if not current_price:
+        logger.warning(f"No price found in price_data: {price_data}")
+        return
+    
+    # Conflated ticks also carry the low/high traded since the last flush,
+    # so a short spike between flushes still triggers SL/TP
+    low = price_data.get("low", current_price)
+    high = price_data.get("high", current_price)
+    
+    if order_trigger_index.triggered(symbol, low, high):
+        tick_pipeline.submit(symbol, price_data)
+
+
+def process_price_tick(symbol: str, price_data: dict) -> dict:
+    """
+    Runs on the tick pipeline's thread pool (never on the event loop).
+    Closes triggered orders and returns plain-dict notifications.
     """
-    from sqlalchemy.orm import Session
     from ..db import SessionLocal
-    from .manager import manager
     from ..services.demo_trading_engine import DemoTradingEngine
     
+    current_price = price_data.get("price") or price_data.get("last_price")
+    
     db = SessionLocal()
     try:
-        # Extract current price
-        current_price = price_data.get("price") or price_data.get("last_price")
-        
-        if not current_price:
-            logger.warning(f"No price found in price_data: {price_data}")
-            return
+        closed_orders = DemoTradingEngine.check_and_close_orders(
+            db,
+            symbol,
+            current_price,
+            low=price_data.get("low"),
+            high=price_data.get("high"),
+        )
         
-        logger.info(f"📊 Checking orders for {symbol} @ ${current_price}")
+        if not closed_orders:
+            return {}
         
-        # Check and close orders
-        closed_orders = DemoTradingEngine.check_and_close_orders(db, symbol, current_price)
+        wallets = DemoTradingEngine.get_wallets(db, {order.user_id for order in closed_orders})
         
-        # Broadcast closed orders to all users
-        for order in closed_orders:
-            await manager.send_personal_message({
-                "type": "order_closed",
-                "data": {
+        return {
+            "closed_orders": [
+                {
                     "id": order.id,
+                    "user_id": order.user_id,
                     "symbol": order.symbol,
                     "side": order.side,
                     "size": order.size,
@@ -214,19 +559,33 @@ async def handle_price_tick_for_trading(symbol: str, price_data: dict):
                     "pnl": order.pnl,
                     "status": order.status,
                 }
-            }, order.user_id)
-            
-            # Also send wallet update
-            wallet = DemoTradingEngine.get_or_create_wallet(db, order.user_id)
-            await manager.send_personal_message({
-                "type": "wallet_updated",
-                "data": {
-                    "balance": wallet.balance,
-                    "currency": wallet.currency,
-                }
-            }, order.user_id)
-    
-    except Exception as e:
-        logger.error(f"Error handling price tick for trading: {e}", exc_info=True)
+                for order in closed_orders
+            ],
+            "wallets": {
+                user_id: {"balance": wallet.balance, "currency": wallet.currency}
+                for user_id, wallet in wallets.items()
+            },
+        }
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+
+async def deliver_trading_notifications(symbol: str, result: dict):
+    """Runs back on the event loop: notify owners of closed orders"""
+    for order in result["closed_orders"]:
+        user_id = order.pop("user_id")
+        await manager.send_personal_message({
+            "type": "order_closed",
+            "data": order
+        }, user_id)
+    
+    # Also send one wallet update per affected user
+    for user_id, wallet in result["wallets"].items():
+        await manager.send_personal_message({
+            "type": "wallet_updated",
+            "data": wallet
+        }, user_id)
+
+
+# SL/TP DB work runs here, one worker per symbol on a bounded thread pool
+tick_pipeline = TickPipeline(process_price_tick, deliver_trading_notifications, settings.TICK_DB_WORKERS)
@@ -1,9 +1,93 @@
 from fastapi import WebSocket
-from typing import Dict, List, Set
+from collections import deque
+from typing import Callable, Deque, Dict, Iterable, List, Optional, Set, Tuple
 import json
 import asyncio
+from ..config import settings
 from ..utils.logger import logger
 
+
+def encode_message(message: dict) -> str:
+    """Encode a message exactly like WebSocket.send_json does"""
+    return json.dumps(message, separators=(",", ":"), ensure_ascii=False)
+
+
+class OutboundQueue:
+    """
+    Bounded send queue for one WebSocket, drained by its own writer task.
+    
+    Flow:
+    1. Broadcasters enqueue pre-encoded messages and return immediately.
+    2. The writer task sends them in order, each bounded by WS_SEND_TIMEOUT.
+    3. When the queue is full, WS_OVERFLOW_POLICY decides what happens:
+       - "coalesce": a queued message with the same key (e.g. the previous
+         price for a symbol) is replaced in place; otherwise as drop_oldest
+       - "drop_oldest": the oldest droppable (keyed) message is evicted
+       - "disconnect": the client is dropped
+       If only non-droppable messages (orders, wallet) are queued the client
+       is dropped, since it cannot keep up anyway.
+    """
+    
+    def __init__(self, websocket: WebSocket, user_id: int, on_dead: Callable[[int], None]):
+        self.websocket = websocket
+        self.user_id = user_id
+        self.on_dead = on_dead
+        
+        # (coalesce_key or None, encoded message)
+        self._queue: Deque[Tuple[Optional[str], str]] = deque()
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._writer())
+    
+    def __len__(self) -> int:
+        return len(self._queue)
+    
+    def enqueue(self, text: str, key: Optional[str] = None) -> bool:
+        """Queue a message; returns False if the client should be dropped"""
+        policy = settings.WS_OVERFLOW_POLICY
+        
+        if key is not None and policy == "coalesce":
+            for i, (queued_key, _) in enumerate(self._queue):
+                if queued_key == key:
+                    self._queue[i] = (key, text)
+                    return True
+        
+        if len(self._queue) >= settings.WS_SEND_QUEUE_SIZE:
+            if policy == "disconnect":
+                return False
+            
+            victim = next((i for i, (queued_key, _) in enumerate(self._queue) if queued_key is not None), None)
+            if victim is None:
+                return False
+            del self._queue[victim]
+        
+        self._queue.append((key, text))
+        self._wakeup.set()
+        return True
+    
+    def close(self):
+        self._task.cancel()
+        self._queue.clear()
+    
+    async def _writer(self):
+        try:
+            while True:
+                while not self._queue:
+                    self._wakeup.clear()
+                    await self._wakeup.wait()
+                
+                _, text = self._queue.popleft()
+                await asyncio.wait_for(self.websocket.send_text(text), timeout=settings.WS_SEND_TIMEOUT)
+        
+        except asyncio.CancelledError:
+            raise
+        except asyncio.TimeoutError:
+            logger.warning(f"⏳ Send to user {self.user_id} timed out, dropping slow connection")
+            self.on_dead(self.user_id)
+        except Exception as e:
+            logger.error(f"Error sending message to user {self.user_id}: {e}")
+            self.on_dead(self.user_id)
+
+
 class ConnectionManager:
     def __init__(self):
         # -------------------------
@@ -12,6 +96,12 @@ class ConnectionManager:
         # -------------------------
         self.active_connections: Dict[int, WebSocket] = {}
         
+        # -------------------------
+        # Bounded outbound queue (and writer task) per connection
+        # {user_id: OutboundQueue}
+        # -------------------------
+        self.send_queues: Dict[int, OutboundQueue] = {}
+        
         # -------------------------
         # Tracks which users are subscribed to each tournament
         # {tournament_id: set(user_ids)}
@@ -23,6 +113,18 @@ class ConnectionManager:
         # {symbol: set(user_ids)}
         # -------------------------
         self.symbol_subscriptions: Dict[str, Set[int]] = {}
+        
+        # -------------------------
+        # Tracks which users are subscribed to each indicator stream
+        # {(symbol, interval, indicator, params): set(user_ids)}
+        # -------------------------
+        self.indicator_subscriptions: Dict[tuple, Set[int]] = {}
+        
+        # -------------------------
+        # Tracks which users are subscribed to live candles
+        # {(symbol, interval): set(user_ids)}
+        # -------------------------
+        self.candle_subscriptions: Dict[Tuple[str, str], Set[int]] = {}
     
     async def connect(self, websocket: WebSocket, user_id: int):
         """
@@ -32,7 +134,13 @@ class ConnectionManager:
         3. User can now receive personal messages or broadcast updates.
         """
         await websocket.accept()
+        
+        # A reconnect replaces the previous socket for this user
+        if user_id in self.send_queues:
+            self.send_queues.pop(user_id).close()
+        
         self.active_connections[user_id] = websocket
+        self.send_queues[user_id] = OutboundQueue(websocket, user_id, self._drop_connection)
         logger.info(f"✅ User {user_id} connected via WebSocket")
     
     def disconnect(self, user_id: int):
@@ -45,13 +153,22 @@ class ConnectionManager:
         if user_id in self.active_connections:
             del self.active_connections[user_id]
             
-            # Remove user from tournament subscriptions
-            for tournament_id, subscribers in self.tournament_subscriptions.items():
-                subscribers.discard(user_id)
+            send_queue = self.send_queues.pop(user_id, None)
+            if send_queue is not None:
+                send_queue.close()
             
-            # Remove user from symbol subscriptions
-            for symbol, subscribers in self.symbol_subscriptions.items():
-                subscribers.discard(user_id)
+            # Remove user from tournament, symbol, indicator and candle
+            # subscriptions (empty sets are dropped so idle symbols show up)
+            for subscriptions in (
+                self.tournament_subscriptions,
+                self.symbol_subscriptions,
+                self.indicator_subscriptions,
+                self.candle_subscriptions,
+            ):
+                for key in list(subscriptions):
+                    subscriptions[key].discard(user_id)
+                    if not subscriptions[key]:
+                        del subscriptions[key]
             
             logger.info(f"❌ User {user_id} disconnected")
     
@@ -79,30 +196,136 @@ class ConnectionManager:
         self.symbol_subscriptions[symbol].add(user_id)
         logger.info(f"📊 User {user_id} subscribed to {symbol}")
     
-    async def send_personal_message(self, message: dict, user_id: int):
+    def unsubscribe_from_symbol(self, user_id: int, symbol: str) -> int:
+        """Removes user from a symbol; returns the subscribers left"""
+        subscribers = self.symbol_subscriptions.get(symbol)
+        if subscribers is None:
+            return 0
+        
+        subscribers.discard(user_id)
+        if not subscribers:
+            del self.symbol_subscriptions[symbol]
+            return 0
+        return len(subscribers)
+    
+    def has_market_subscribers(self, symbol: str) -> bool:
+        """True while anyone follows the symbol's prices, candles or indicators"""
+        if self.symbol_subscriptions.get(symbol):
+            return True
+        if any(key[0] == symbol and subscribers for key, subscribers in self.candle_subscriptions.items()):
+            return True
+        return any(key[0] == symbol and subscribers for key, subscribers in self.indicator_subscriptions.items())
+    
+    def subscribe_to_candles(self, user_id: int, symbol: str, interval: str):
+        """
+        Flow:
+        1. Adds user to the set of subscribers for a symbol/interval.
+        2. The bar in progress and every closed bar are pushed to these users.
+        """
+        key = (symbol, interval)
+        if key not in self.candle_subscriptions:
+            self.candle_subscriptions[key] = set()
+        
+        self.candle_subscriptions[key].add(user_id)
+        logger.info(f"🕯️ User {user_id} subscribed to {symbol} {interval} candles")
+    
+    def unsubscribe_from_candles(self, user_id: int, symbol: str, interval: str) -> int:
+        """Removes user from a symbol/interval; returns the subscribers left"""
+        key = (symbol, interval)
+        subscribers = self.candle_subscriptions.get(key)
+        if subscribers is None:
+            return 0
+        
+        subscribers.discard(user_id)
+        if not subscribers:
+            del self.candle_subscriptions[key]
+            return 0
+        return len(subscribers)
+    
+    def subscribe_to_indicator(self, user_id: int, key: tuple):
+        """
+        Flow:
+        1. Adds user to the set of subscribers for an indicator stream.
+        2. Each closed bar's indicator values are pushed to these users.
+        """
+        if key not in self.indicator_subscriptions:
+            self.indicator_subscriptions[key] = set()
+        
+        self.indicator_subscriptions[key].add(user_id)
+        logger.info(f"📈 User {user_id} subscribed to {key[2]} on {key[0]} {key[1]}")
+    
+    def unsubscribe_from_indicator(self, user_id: int, key: tuple) -> int:
+        """Removes user from an indicator stream; returns the subscribers left"""
+        subscribers = self.indicator_subscriptions.get(key)
+        if subscribers is None:
+            return 0
+        
+        subscribers.discard(user_id)
+        if not subscribers:
+            del self.indicator_subscriptions[key]
+            return 0
+        return len(subscribers)
+    
+    async def send_personal_message(self, message: dict, user_id: int, key: Optional[str] = None):
         """
         Flow:
         1. Sends a JSON message to a specific user's WebSocket.
         2. Handles exceptions and disconnects user if WebSocket is invalid.
+        3. Keyed messages may be coalesced/dropped under backpressure.
         """
-        if user_id in self.active_connections:
-            try:
-                await self.active_connections[user_id].send_json(message)
-            except Exception as e:
-                logger.error(f"Error sending message to user {user_id}: {e}")
-                self.disconnect(user_id)
+        self._enqueue(encode_message(message), user_id, key)
+    
+    def _enqueue(self, text: str, user_id: int, key: Optional[str] = None):
+        """
+        Flow:
+        1. Puts an already-encoded message on the user's bounded send queue.
+        2. Drops the user if the overflow policy says it cannot keep up.
+        """
+        send_queue = self.send_queues.get(user_id)
+        if send_queue is None:
+            return
+        
+        if not send_queue.enqueue(text, key):
+            logger.warning(f"📦 Send queue overflow for user {user_id}, dropping connection")
+            self._drop_connection(user_id)
+    
+    def _drop_connection(self, user_id: int):
+        """Disconnect a user that failed or fell behind, and close its socket"""
+        websocket = self.active_connections.get(user_id)
+        self.disconnect(user_id)
+        if websocket is not None:
+            asyncio.create_task(self._close_quietly(websocket))
+    
+    async def _close_quietly(self, websocket: WebSocket):
+        try:
+            await websocket.close()
+        except Exception:
+            pass
+    
+    async def _broadcast(self, message: dict, user_ids: Iterable[int], key: Optional[str] = None):
+        """
+        Flow:
+        1. Encodes the message once for all recipients.
+        2. Enqueues it on every recipient's send queue (writers send concurrently).
+        """
+        user_ids = list(user_ids)
+        if not user_ids:
+            return
+        
+        text = encode_message(message)
+        for user_id in user_ids:
+            self._enqueue(text, user_id, key)
     
     async def broadcast_to_tournament(self, message: dict, tournament_id: int):
         """
         Flow:
-        1. Iterates over all users subscribed to a tournament.
-        2. Sends each user the provided message using send_personal_message().
+        1. Collects all users subscribed to a tournament.
+        2. Sends each user the provided message in one concurrent broadcast.
         """
         if tournament_id in self.tournament_subscriptions:
             subscribers = self.tournament_subscriptions[tournament_id].copy()
             
-            for user_id in subscribers:
-                await self.send_personal_message(message, user_id)
+            await self._broadcast(message, subscribers)
     
     async def broadcast_price_update(self, symbol: str, price_data: dict):
         """
@@ -119,8 +342,53 @@ class ConnectionManager:
                 "data": price_data
             }
             
-            for user_id in subscribers:
-                await self.send_personal_message(message, user_id)
+            # Keyed so a newer price replaces one still waiting in a queue
+            await self._broadcast(message, subscribers, key=f"price_update:{symbol}")
+    
+    async def broadcast_kline_update(self, symbol: str, interval: str, bar: dict, closed: bool):
+        """
+        Flow:
+        1. Creates a kline_update message for the bar in progress or a closed bar.
+        2. Sends it to all candle subscribers of the symbol/interval.
+        """
+        subscribers = self.candle_subscriptions.get((symbol, interval))
+        if not subscribers:
+            return
+        
+        message = {
+            "type": "kline_update",
+            "symbol": symbol,
+            "interval": interval,
+            "closed": closed,
+            "data": bar
+        }
+        
+        # In-progress updates of the same bar may replace each other in a
+        # queue; closed bars are never dropped
+        key = None if closed else f"kline_update:{symbol}:{interval}:{bar['time']}"
+        await self._broadcast(message, subscribers.copy(), key=key)
+    
+    async def broadcast_indicator_update(self, key: tuple, bar_time: int, values: dict):
+        """
+        Flow:
+        1. Creates an indicator_update message for one closed bar.
+        2. Sends it to all subscribers of the indicator stream.
+        """
+        subscribers = self.indicator_subscriptions.get(key)
+        if not subscribers:
+            return
+        
+        symbol, interval, indicator, params = key
+        message = {
+            "type": "indicator_update",
+            "symbol": symbol,
+            "interval": interval,
+            "indicator": indicator,
+            "params": dict(params),
+            "data": {"time": bar_time, **values}
+        }
+        
+        await self._broadcast(message, subscribers.copy())
     
     async def broadcast_leaderboard_update(self, tournament_id: int, leaderboard_data: list):
         """
@@ -1,16 +1,117 @@
-import redis
+import json
+import uuid
 import asyncio
+from typing import Callable, Optional
+import redis.asyncio as aioredis
 from .manager import manager
+from ..services.order_trigger_index import ORDER_INDEX_CHANNEL, order_trigger_index
+from ..config import settings
+from ..utils.logger import logger
+
+# Channel patterns bridged between workers
+TRADE_CHANNELS = "tournament:*:trades"
+LEADERBOARD_CHANNELS = "tournament:*:leaderboard_updates"
+PRICE_CHANNELS = "price:*"
+
+
+def leaderboard_channel(tournament_id: int) -> str:
+    return f"tournament:{tournament_id}:leaderboard_updates"
+
+
+def price_channel(symbol: str) -> str:
+    return f"price:{symbol.upper()}"
+
 
 class StreamHandler:
-    def __init__(self, redis_url: str):
-        self.redis_client = redis.from_url(redis_url)
-    
+    """
+    Redis pub/sub bridge so several uvicorn workers share one event stream.
+
+    Flow:
+    1. run() pattern-subscribes to the trade, leaderboard and price channels
+       on an asyncio Redis connection (never blocks the event loop) and
+       resubscribes after connection errors.
+    2. Every message is dispatched to this worker's ConnectionManager
+       subscribers (trade_executed, leaderboard_update, price_update);
+       SL/TP trigger index changes go to the local order_trigger_index.
+    3. publish_price() shares a locally streamed (conflated) price with the
+       other workers. Each message carries this process' origin id, so a
+       worker never re-broadcasts its own prices, and symbols this worker
+       streams from Binance itself are skipped as well.
+    """
+
+    def __init__(self, redis_url: str, is_local_feed: Optional[Callable[[str], bool]] = None):
+        self.redis_client = aioredis.from_url(redis_url)
+        self.origin = uuid.uuid4().hex
+        self.is_local_feed = is_local_feed or (lambda symbol: False)
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        if self._task is None and settings.PUBSUB_BRIDGE_ENABLED:
+            self._task = asyncio.create_task(self.subscribe_to_updates())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        await self.redis_client.close()
+
     async def subscribe_to_updates(self):
         """Subscribe to Redis and broadcast to WebSocket clients"""
-        pubsub = self.redis_client.pubsub()
-        pubsub.subscribe('market_updates')
-        
-        for message in pubsub.listen():
-            if message['type'] == 'message':
-                await manager.broadcast(message['data'])
+        while True:
+            pubsub = self.redis_client.pubsub()
+            try:
+                await pubsub.psubscribe(TRADE_CHANNELS, LEADERBOARD_CHANNELS, PRICE_CHANNELS, ORDER_INDEX_CHANNEL)
+                logger.info(f"🔀 Redis pub/sub bridge listening (origin {self.origin[:8]})")
+
+                async for message in pubsub.listen():
+                    if message["type"] != "pmessage":
+                        continue
+                    try:
+                        await self._dispatch(message["channel"].decode(), json.loads(message["data"]))
+                    except Exception as e:
+                        logger.error(f"Failed to dispatch pub/sub message on {message['channel']}: {e}")
+
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Redis pub/sub bridge error, resubscribing: {e}")
+                await asyncio.sleep(settings.PUBSUB_RECONNECT_SECONDS)
+            finally:
+                try:
+                    await pubsub.aclose()
+                except Exception:
+                    pass
+
+    async def _dispatch(self, channel: str, payload: dict):
+        """Route one bridged message to the matching local broadcast"""
+        if channel == ORDER_INDEX_CHANNEL:
+            order_trigger_index.apply_remote(payload)
+            return
+
+        if channel.startswith("price:"):
+            symbol = channel.split(":", 1)[1]
+            if payload.get("origin") == self.origin or self.is_local_feed(symbol):
+                return
+            await manager.broadcast_price_update(symbol, payload["data"])
+            return
+
+        tournament_id = int(channel.split(":")[1])
+
+        if channel.endswith(":trades"):
+            trade_data = {k: v for k, v in payload.items() if k not in ("type", "tournament_id")}
+            await manager.broadcast_trade_executed(tournament_id, trade_data)
+        elif channel.endswith(":leaderboard_updates"):
+            await manager.broadcast_leaderboard_update(tournament_id, payload["data"])
+
+    async def publish_price(self, symbol: str, price_data: dict):
+        """Share a conflated price with the other workers"""
+        if not settings.PUBSUB_BRIDGE_ENABLED:
+            return
+
+        try:
+            await self.redis_client.publish(
+                price_channel(symbol),
+                json.dumps({"origin": self.origin, "data": price_data})
+            )
+        except Exception as e:
+            logger.warning(f"Failed to publish price for {symbol}: {e}")
@@ -0,0 +1,98 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Awaitable, Callable, Dict
+from ..utils.logger import logger
+
+
+class TickPipeline:
+    """
+    Tick consumer that keeps synchronous DB work off the event loop.
+
+    Flow:
+    1. submit() stores the tick as the symbol's pending work (no DB, no await).
+    2. One long-lived worker task per symbol picks it up and runs `process`
+       on a shared, bounded thread pool (sessions, queries, commits).
+    3. The worker awaits `deliver` with the result back on the event loop
+       (WebSocket notifications).
+    4. Ticks arriving while a symbol's worker is busy are coalesced: latest
+       price wins and low/high widen, so nothing crossed in between is lost
+       and a slow DB never builds a backlog.
+    5. stop(symbol) retires a symbol's worker once its stream is released;
+       a job already running still finishes and delivers.
+    """
+
+    def __init__(
+        self,
+        process: Callable[[str, dict], Any],
+        deliver: Callable[[str, Any], Awaitable],
+        max_workers: int
+    ):
+        self.process = process
+        self.deliver = deliver
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="tick-db")
+
+        # {symbol: coalesced tick waiting for the worker}
+        self._pending: Dict[str, dict] = {}
+        self._wakeups: Dict[str, asyncio.Event] = {}
+        self._workers: Dict[str, asyncio.Task] = {}
+
+    def submit(self, symbol: str, tick: dict):
+        price = tick.get("price") or tick.get("last_price")
+        pending = self._pending.get(symbol)
+
+        if pending is None:
+            pending = dict(tick)
+            pending.setdefault("low", price)
+            pending.setdefault("high", price)
+            self._pending[symbol] = pending
+        else:
+            low = min(pending["low"], tick.get("low", price))
+            high = max(pending["high"], tick.get("high", price))
+            pending.update(tick)
+            pending["low"] = low
+            pending["high"] = high
+
+        worker = self._workers.get(symbol)
+        if worker is None or worker.done():
+            self._wakeups[symbol] = asyncio.Event()
+            self._workers[symbol] = asyncio.create_task(self._worker(symbol))
+
+        self._wakeups[symbol].set()
+
+    async def _worker(self, symbol: str):
+        loop = asyncio.get_running_loop()
+        wakeup = self._wakeups[symbol]
+
+        while True:
+            await wakeup.wait()
+            wakeup.clear()
+
+            # Stopped (or replaced by a newer worker)
+            if self._wakeups.get(symbol) is not wakeup:
+                return
+
+            tick = self._pending.pop(symbol, None)
+            if tick is None:
+                continue
+
+            try:
+                result = await loop.run_in_executor(self.executor, self.process, symbol, tick)
+                if result:
+                    await self.deliver(symbol, result)
+            except Exception as e:
+                logger.error(f"Tick pipeline error for {symbol}: {e}", exc_info=True)
+
+    def stop(self, symbol: str):
+        """Drop a symbol's pending tick and let its worker exit"""
+        self._pending.pop(symbol, None)
+        self._workers.pop(symbol, None)
+
+        wakeup = self._wakeups.pop(symbol, None)
+        if wakeup is not None:
+            wakeup.set()
+
+    def shutdown(self):
+        for worker in self._workers.values():
+            worker.cancel()
+        self._workers.clear()
+        self.executor.shutdown(wait=False)
@@ -1,5 +1,8 @@
 from celery import Celery
 from ..config import settings
+from ..db import SessionLocal
+from ..services.binance_service import get_binance_service
+from ..services.candle_store import CandleStore
 
 celery_app = Celery('tasks', broker=settings.REDIS_URL)
 
@@ -17,3 +20,12 @@ def end_tournament(tournament_id: int):
 def export_tournament_data(tournament_id: int):
     """Export tournament data to CSV"""
     pass
+
+@celery_app.task
+def backfill_candles(symbol: str, interval: str, start_time: int, end_time: int):
+    """Load closed candles for a time range (Unix seconds) into the candle store"""
+    db = SessionLocal()
+    try:
+        return CandleStore.backfill(db, get_binance_service(), symbol, interval, start_time, end_time)
+    finally:
+        db.close()
@@ -0,0 +1,190 @@
+"""
+Single market-data ingestor (MARKET_DATA_MODE=ingestor).
+
+Run it as a dedicated process with `python -m app.workers.market_ingestor`.
+API workers in ingestor mode are candidates as well, so one of them takes
+over while no dedicated process holds the lease.
+"""
+import os
+import time
+import uuid
+import socket
+import asyncio
+from typing import List, Optional, Set
+import redis.asyncio as aioredis
+from ..config import settings
+from ..services.binance_service import get_binance_service
+from ..services.market_stream import INGESTOR_LEASE_KEY, INTEREST_KEY, encode_tick, stream_key
+from ..utils.logger import logger
+
+# Extend / release the lease only while we still hold it
+RENEW_LEASE_SCRIPT = """
+if redis.call("get", KEYS[1]) == ARGV[1] then
+    return redis.call("pexpire", KEYS[1], ARGV[2])
+end
+return 0
+"""
+
+RELEASE_LEASE_SCRIPT = """
+if redis.call("get", KEYS[1]) == ARGV[1] then
+    return redis.call("del", KEYS[1])
+end
+return 0
+"""
+
+
+class MarketIngestor:
+    """
+    The one process that talks to Binance for market data.
+
+    Flow:
+    1. Every candidate tries to take the lease (SET NX PX) each
+       INGESTOR_SYNC_SECONDS; the holder renews it on the same schedule.
+    2. The holder keeps one Binance trade stream per symbol in the interest
+       zset (symbols API workers are reading, expired entries dropped) and
+       unsubscribes symbols nobody asks for anymore.
+    3. Every trade is normalized and buffered; a publisher task writes the
+       buffer with pipelined XADD ... MAXLEN ~ MARKET_STREAM_MAXLEN to the
+       symbol's Redis Stream.
+    4. Losing the lease (or stopping) drops every Binance stream, so at most
+       one process feeds the streams at a time.
+    """
+
+    def __init__(self, redis_url: str):
+        self.redis = aioredis.from_url(redis_url)
+        self.binance = get_binance_service()
+        self.token = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.leader = False
+
+        self._symbols: Set[str] = set()
+        self._buffer: List[dict] = []
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await self.redis.close()
+
+    async def run(self):
+        self._wakeup = asyncio.Event()
+        publisher = asyncio.create_task(self._publish_loop())
+
+        try:
+            while True:
+                try:
+                    await self._hold_lease()
+                    if self.leader:
+                        await self._sync_symbols()
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    logger.error(f"Market ingestor cycle failed: {e}")
+
+                await asyncio.sleep(settings.INGESTOR_SYNC_SECONDS)
+        finally:
+            publisher.cancel()
+            await self._step_down()
+
+    async def _hold_lease(self):
+        """Take the lease if it is free, renew it if we hold it"""
+        if self.leader:
+            renewed = await self.redis.eval(
+                RENEW_LEASE_SCRIPT, 1, INGESTOR_LEASE_KEY, self.token, settings.INGESTOR_LEASE_TTL_MS
+            )
+            if not renewed:
+                logger.warning("⚠️ Market ingestor lease lost, dropping Binance streams")
+                await self._drop_streams()
+                self.leader = False
+            return
+
+        acquired = await self.redis.set(
+            INGESTOR_LEASE_KEY, self.token, nx=True, px=settings.INGESTOR_LEASE_TTL_MS
+        )
+        if acquired:
+            self.leader = True
+            logger.info(f"👑 Elected market-data ingestor ({self.token})")
+
+    async def _step_down(self):
+        if not self.leader:
+            return
+
+        self.leader = False
+        await self._drop_streams()
+        try:
+            await self.redis.eval(RELEASE_LEASE_SCRIPT, 1, INGESTOR_LEASE_KEY, self.token)
+        except Exception as e:
+            logger.warning(f"Failed to release market ingestor lease: {e}")
+
+    async def _sync_symbols(self):
+        """Match the Binance streams to the symbols workers are reading"""
+        await self.redis.zremrangebyscore(INTEREST_KEY, "-inf", time.time())
+        wanted = {symbol.decode() for symbol in await self.redis.zrange(INTEREST_KEY, 0, -1)}
+
+        for symbol in wanted - self._symbols:
+            await self.binance.subscribe_to_trade(symbol, self._on_trade)
+            self._symbols.add(symbol)
+            logger.info(f"🚀 Ingesting {symbol} trades")
+
+        for symbol in self._symbols - wanted:
+            await self.binance.unsubscribe(symbol, "trade")
+            self._symbols.discard(symbol)
+            logger.info(f"🛑 Stopped ingesting {symbol} trades (no readers)")
+
+    async def _drop_streams(self):
+        for symbol in list(self._symbols):
+            try:
+                await self.binance.unsubscribe(symbol, "trade")
+            except Exception as e:
+                logger.warning(f"Failed to unsubscribe {symbol}: {e}")
+        self._symbols.clear()
+        self._buffer.clear()
+
+    def _on_trade(self, trade: dict):
+        """Binance trade callback: buffer the tick for the publisher"""
+        if not self.leader:
+            return
+        self._buffer.append(trade)
+        self._wakeup.set()
+
+    async def _publish_loop(self):
+        while True:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+
+            batch, self._buffer = self._buffer, []
+            if not batch:
+                continue
+
+            pipe = self.redis.pipeline(transaction=False)
+            for trade in batch:
+                pipe.xadd(
+                    stream_key(trade["symbol"]),
+                    encode_tick(trade),
+                    maxlen=settings.MARKET_STREAM_MAXLEN,
+                    approximate=True
+                )
+
+            try:
+                await pipe.execute()
+            except Exception as e:
+                logger.error(f"Failed to publish {len(batch)} market ticks: {e}")
+
+
+async def main():
+    ingestor = MarketIngestor(settings.REDIS_URL)
+    try:
+        await ingestor.run()
+    finally:
+        await ingestor.redis.close()
+        await get_binance_service().rest.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())